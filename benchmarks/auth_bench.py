@@ -0,0 +1,30 @@
+"""Auth token validation benchmarks (see models/user.py)"""
+
+from . import bench_utils
+
+from models import user as user_module
+from models.user import User
+
+
+class AuthTokenBenchmarks(bench_utils.Benchmark):
+  """User.get_by_auth_token() as called by auth.get_user_by_session()"""
+  ITERATIONS = 1000
+
+  def setUp(self):
+    super(AuthTokenBenchmarks, self).setUp()
+    self.user_id = User(display_name='Bench').put().id()
+    self.token = User.create_auth_token(self.user_id)
+    # start cold: nothing in-process, so the first lookups go to memcache
+    # and the datastore
+    user_module._token_cache.lru.clear()
+    user_module._token_cache.reset_stats()
+
+  def tearDown(self):
+    self.metrics.update(hit_rate='%.3f' % user_module._token_cache.stats()['hit_rate'])
+    super(AuthTokenBenchmarks, self).tearDown()
+
+  def benchValidToken(self):
+    User.get_by_auth_token(self.user_id, self.token)
+
+  def benchUnknownToken(self):
+    User.get_by_auth_token(self.user_id, 'not-a-token')
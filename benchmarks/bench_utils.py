@@ -0,0 +1,82 @@
+"""Benchmarks utilities"""
+
+import gc
+import math
+import time
+
+from tests import test_utils
+
+
+def percentile(sorted_values, pct):
+  """Returns pct-th percentile of an already sorted list (nearest rank)"""
+  if not sorted_values:
+    return 0.0
+  rank = int(math.ceil(pct / 100.0 * len(sorted_values))) - 1
+  return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def measure(fn, iterations, warmup=0):
+  """Runs fn() iterations times and returns a dict of stats.
+
+  Allocations are approximated by the number of new objects tracked
+  by the garbage collector, which is what Python 2.7 can offer without
+  a C extension. The collector is disabled while timing.
+  """
+  for _ in xrange(warmup):
+    fn()
+
+  timings = []
+  gc.collect()
+  gc.disable()
+  try:
+    objects_before = len(gc.get_objects())
+    start = time.time()
+    for _ in xrange(iterations):
+      t0 = time.time()
+      fn()
+      timings.append(time.time() - t0)
+    total = time.time() - start
+    objects_after = len(gc.get_objects())
+  finally:
+    gc.enable()
+
+  timings.sort()
+  return {
+    'iterations': iterations,
+    'total_s': total,
+    'rps': iterations / total if total else 0.0,
+    'p50_ms': percentile(timings, 50) * 1000,
+    'p99_ms': percentile(timings, 99) * 1000,
+    'allocs': max(0, objects_after - objects_before) / float(iterations),
+  }
+
+
+class Benchmark(test_utils.WebTestBase):
+  """Base class for all app benchmarks.
+
+  Every method whose name starts with 'bench' is timed by benchmarks_runner.py
+  within a fresh testbed (setUp/tearDown are run around each benchmark,
+  not around each iteration). Additional numbers, e.g. cache hit rates,
+  can be reported by putting them into self.metrics.
+
+  class HomeBenchmarks(Benchmark):
+    APP = main.app
+
+    def benchHome(self):
+      self.app.get('/')
+  """
+  ITERATIONS = 200
+  WARMUP = 10
+
+  def __init__(self, methodName='runTest'):
+    super(Benchmark, self).__init__(methodName)
+    self.metrics = {}
+
+  def runTest(self):
+    """unittest.TestCase requires a test method to instantiate"""
+    pass
+
+  @classmethod
+  def list_benchmarks(cls):
+    return sorted(n for n in dir(cls)
+                  if n.startswith('bench') and callable(getattr(cls, n)))
@@ -0,0 +1,78 @@
+"""Request pipeline benchmarks: full requests, rendering, formatting, models"""
+
+import webapp2
+from google.appengine.ext import ndb
+
+from . import bench_utils
+
+import main
+import fmt
+from handlers.base import BaseHandler
+from models.user import User
+
+
+class RequestBenchmarks(bench_utils.Benchmark):
+  """Full requests through main.app with webtest"""
+  APP = main.app
+
+  def setUp(self):
+    super(RequestBenchmarks, self).setUp()
+    self.expectErrors()
+
+  def benchHomepage(self):
+    self.app.get('/')
+
+  def benchNotepad(self):
+    self.app.get('/notepad')
+
+  def benchNotFound(self):
+    self.app.get('/random-page', status=404)
+
+
+class RenderBenchmarks(bench_utils.Benchmark):
+  """BaseHandler.render() without the routing and WSGI overhead"""
+
+  def setUp(self):
+    super(RenderBenchmarks, self).setUp()
+    request = webapp2.Request.blank('/')
+    request.app = main.webapp
+    main.webapp.set_globals(app=main.webapp, request=request)
+    self.handler = BaseHandler(request, webapp2.Response())
+
+  def tearDown(self):
+    main.webapp.clear_globals()
+    super(RenderBenchmarks, self).tearDown()
+
+  def benchRenderHome(self):
+    self.handler.response.clear()
+    self.handler.render('home', msg='It works')
+
+  def benchRenderNotepad(self):
+    self.handler.response.clear()
+    self.handler.render('notepad')
+
+
+class FmtBenchmarks(bench_utils.Benchmark):
+  """lib/fmt.py"""
+  ITERATIONS = 2000
+  TEXT = ('Here\'s some link http://www.cloudware.it in between.\n'
+          'And another one https://example.org/path?q=1#top\n\n') * 10
+
+  def benchSimpleFormat(self):
+    fmt.simple_format(self.TEXT)
+
+
+class UserBenchmarks(bench_utils.Benchmark):
+  """models.User against the datastore stub"""
+
+  def setUp(self):
+    super(UserBenchmarks, self).setUp()
+    self.user_key = User(display_name='Bench').put()
+
+  def benchPut(self):
+    User(display_name='Bench').put()
+
+  def benchGet(self):
+    # make sure we hit the datastore stub, not the in-context cache
+    ndb.get_context().clear_cache()
+    User.get_by_id(self.user_key.id(), use_memcache=False)
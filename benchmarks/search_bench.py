@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""User prefix search benchmarks (see models/search.py).
+
+Searches an index of BENCH_USERS (env var, default 100000) synthetic users,
+written straight into the datastore stub at setUp, which takes a while.
+"""
+
+import os
+import random
+import itertools
+
+from google.appengine.ext import ndb
+
+from . import bench_utils
+
+from models import search
+from models.summary import UserSummaryRecord
+
+BENCH_USERS = int(os.environ.get('BENCH_USERS', 100000))
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'Dave', 'Eve', 'Frank', 'Grace',
+               'Heidi', 'Ivan', 'Judy', 'Mallory', 'Oscar', 'Peggy', 'Trent',
+               'Victor', 'Walter', 'Sybil', 'Zoe', u'José', u'Łukasz']
+LAST_NAMES = ['Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson',
+              'Johnson', 'Davies', 'Robinson', 'Wright', 'Thompson', 'Evans',
+              'Walker', 'White', 'Roberts', 'Green', 'Hall', 'Wood', 'Jackson',
+              u'Álvarez', u'Müller', 'Rossi', 'Dubois', 'Novak', 'Kowalski']
+QUERIES = ['al', 'alice sm', 'jo', 'wal', 'mu', 'zoe ro', 'e', 'tr wh',
+           'frank 12', 'nobody']
+
+
+class UserSearchBenchmarks(bench_utils.Benchmark):
+  """search.search() over BENCH_USERS indexed users"""
+  ITERATIONS = 100
+
+  def setUp(self):
+    super(UserSearchBenchmarks, self).setUp()
+    rnd = random.Random(0)
+    batch = []
+    for i in xrange(1, BENCH_USERS + 1):
+      name = u'%s %s %d' % (rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES),
+                            rnd.randint(1, 9999))
+      batch.append(search.UserSearchIndex(id=i, tokens=search.tokens(name)))
+      batch.append(UserSummaryRecord(id=i, display_name=name,
+                                     avatar_url='/img/missing-avatar.jpg'))
+      if len(batch) >= 1000:
+        ndb.put_multi(batch)
+        batch = []
+    ndb.put_multi(batch)
+    self.queries = itertools.cycle(QUERIES)
+    self.metrics['users'] = BENCH_USERS
+
+  def benchSearchUncached(self):
+    search.search_ids(next(self.queries), use_cache=False)
+
+  def benchSearchCached(self):
+    search.search(next(self.queries))
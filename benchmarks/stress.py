@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Concurrency stress harness for main.app (app.yaml says threadsafe: yes).
+
+Serves main.app from a threaded WSGI server (a thread per request) with
+the same testbed stubs as the tests, and drives it with N client threads,
+each with its own cookie jar, for every N in --threads. Every client:
+
+  1. POSTs a multipart form with a unique token and an upload to a probe
+     handler, a BaseHandler routed in front of main.app routes (in a copy
+     of main.app, which itself is left as it is). It echoes
+     the token, the upload (parsed by appengine_config's MultiDict patch),
+     the token rendered with the shared Jinja2 environment and its
+     cached_property values, and stores the token in the client's session.
+  2. GETs the token back from the session.
+
+Any response which doesn't carry the client's own token is a leak of state
+between concurrent requests. Reports req/s, p50/p99 latency, errors and
+leaks for every thread count; exits with status 1 if there were any.
+
+Usage:
+  python -m benchmarks.stress [--threads 1,2,4,8,16] [-n REQUESTS_PER_CLIENT]
+"""
+
+import sys
+import json
+import time
+import uuid
+import urllib2
+import argparse
+import threading
+import cookielib
+import SocketServer
+from wsgiref import simple_server
+
+import webapp2
+
+from tests import test_utils
+from benchmarks.bench_utils import percentile
+
+import main
+from conf import app_config
+from compress import GzipMiddleware
+from handlers.base import BaseHandler
+
+PROBE_PATH = '/_stress/probe'
+PROBE_TEMPLATE = u'<b>{{ token }}</b>'
+
+
+class ProbeHandler(BaseHandler):
+  def post(self):
+    token = self.request.POST['token']
+    upload = self.request.POST['upload']
+    template = self.jinja2.environment.from_string(PROBE_TEMPLATE)
+    self.session['token'] = token
+    self.render_json({
+      'token': token,
+      'upload': upload.value,
+      'rendered': template.render(token=token),
+      'locale': self.locale,
+      'session': self.session['token'],
+    })
+
+  def get(self):
+    self.render_json({'session': self.session.get('token')})
+
+
+class ThreadingWSGIServer(SocketServer.ThreadingMixIn,
+                          simple_server.WSGIServer):
+  daemon_threads = True
+  # clients reconnect for every request
+  request_queue_size = 128
+
+
+class QuietHandler(simple_server.WSGIRequestHandler):
+  def log_message(self, *args):
+    pass
+
+
+def probe_app():
+  """Returns a copy of main.app with ProbeHandler route before its
+  catch-all route, wrapped in the same middleware.
+  """
+  webapp = webapp2.WSGIApplication(
+    [webapp2.Route(PROBE_PATH, ProbeHandler)] + main.routes,
+    config=main.webapp.config, debug=main.webapp.debug)
+  webapp.error_handlers = dict(main.webapp.error_handlers)
+  # WSGIApplication() makes itself the current app, main.webapp stays it
+  main.webapp.set_globals(app=main.webapp)
+  return GzipMiddleware(webapp, **app_config['compress'])
+
+
+def serve(wsgi_app):
+  """Serves wsgi_app on a free localhost port in a background thread"""
+  server = simple_server.make_server('localhost', 0, wsgi_app,
+    server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  return server
+
+
+def encode_multipart(fields, files):
+  """Returns (content_type, body) of a multipart/form-data request"""
+  boundary = uuid.uuid4().hex
+  lines = []
+  for name, value in fields.items():
+    lines += ['--' + boundary,
+              'Content-Disposition: form-data; name="%s"' % name,
+              '', value]
+  for name, (filename, value) in files.items():
+    lines += ['--' + boundary,
+              'Content-Disposition: form-data; name="%s"; filename="%s"' %
+                (name, filename),
+              'Content-Type: application/octet-stream',
+              '', value]
+  lines += ['--' + boundary + '--', '']
+  return 'multipart/form-data; boundary=%s' % boundary, '\r\n'.join(lines)
+
+
+class Client(threading.Thread):
+  """Sends probe requests and checks that responses are its own"""
+
+  def __init__(self, base_url, requests):
+    super(Client, self).__init__()
+    self.daemon = True
+    self.base_url = base_url
+    self.requests = requests
+    self.opener = urllib2.build_opener(
+      urllib2.HTTPCookieProcessor(cookielib.CookieJar()))
+    self.timings = []
+    self.errors = []
+    self.leaks = []
+
+  def call(self, data=None, headers={}):
+    request = urllib2.Request(self.base_url + PROBE_PATH, data, headers)
+    started = time.time()
+    body = self.opener.open(request, timeout=30).read()
+    self.timings.append(time.time() - started)
+    return json.loads(body)
+
+  def run(self):
+    for i in xrange(self.requests):
+      token = uuid.uuid4().hex
+      upload = 'upload of %s' % token
+      content_type, body = encode_multipart({'token': token},
+                                            {'upload': ('up.txt', upload)})
+      try:
+        resp = self.call(body, {'Content-Type': content_type})
+        expected = {'token': token, 'upload': upload,
+                    'rendered': '<b>%s</b>' % token, 'session': token}
+        for key, value in expected.items():
+          if resp.get(key) != value:
+            self.leaks.append('%s: %r instead of %r' % (key, resp.get(key), value))
+
+        resp = self.call()
+        if resp.get('session') != token:
+          self.leaks.append('session: %r instead of %r' % (resp.get('session'), token))
+      except Exception, e:
+        self.errors.append('%s: %s' % (e.__class__.__name__, e))
+
+
+def run(base_url, threads, requests):
+  """Runs threads clients concurrently, returns a dict of stats"""
+  clients = [Client(base_url, requests) for _ in xrange(threads)]
+  started = time.time()
+  for c in clients:
+    c.start()
+  for c in clients:
+    c.join()
+  total = time.time() - started
+
+  timings = sorted(t for c in clients for t in c.timings)
+  return {
+    'threads': threads,
+    'requests': len(timings),
+    'rps': len(timings) / total if total else 0.0,
+    'p50_ms': percentile(timings, 50) * 1000,
+    'p99_ms': percentile(timings, 99) * 1000,
+    'errors': [e for c in clients for e in c.errors],
+    'leaks': [l for c in clients for l in c.leaks],
+  }
+
+
+class StressHarness(test_utils.WebTestBase):
+  """Testbed stubs for the server, set up as for any other test"""
+
+  def runTest(self):
+    pass
+
+  def stress(self, thread_counts, requests):
+    """Yields stats of every thread count"""
+    server = serve(probe_app())
+    base_url = 'http://localhost:%d' % server.server_port
+    try:
+      for threads in thread_counts:
+        yield run(base_url, threads, requests)
+    finally:
+      server.shutdown()
+      server.server_close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Concurrency stress of main.app')
+  parser.add_argument('--threads', default='1,2,4,8,16',
+    help='comma separated numbers of concurrent clients')
+  parser.add_argument('-n', '--requests', type=int, default=50,
+    help='probe requests per client (each is a POST and a GET)')
+  parser.add_argument('-v', '--verbose', action='store_true',
+    help='print every error and leak')
+  args = parser.parse_args()
+  thread_counts = [int(n) for n in args.threads.split(',')]
+
+  harness = StressHarness()
+  harness.setUp()
+  failed = False
+  sys.stdout.write('%8s %9s %10s %9s %9s %7s %7s\n' % (
+    'threads', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'errors', 'leaks'))
+  try:
+    for stats in harness.stress(thread_counts, args.requests):
+      sys.stdout.write('%8d %9d %10.1f %9.2f %9.2f %7d %7d\n' % (
+        stats['threads'], stats['requests'], stats['rps'], stats['p50_ms'],
+        stats['p99_ms'], len(stats['errors']), len(stats['leaks'])))
+      if args.verbose:
+        for problem in stats['errors'] + stats['leaks']:
+          sys.stdout.write('  ! %s\n' % problem)
+      failed = failed or stats['errors'] or stats['leaks']
+  finally:
+    harness.tearDown()
+
+  if failed:
+    sys.stderr.write('** Errors or leaks between concurrent requests, '
+                     'see -v for details\n')
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,124 @@
+"""Run all benchmarks and compare them with saved JSON baselines.
+
+Benchmarks live in benchmarks/*_bench.py, in classes named *Benchmarks.
+Every run prints requests/sec, p50/p99 latency and allocations per
+iteration of each benchmark, along with a delta against the baseline
+saved in benchmarks/baselines/<module>.json (if any).
+
+Usage:
+  benchmarks_runner.py [--save] [--tolerance 0.25] [-n ITERATIONS] [module ...]
+
+  --save       store results as the new baselines
+  --tolerance  relative p50 slowdown tolerated before a benchmark is
+               reported as a regression (exit status 1)
+"""
+
+import os
+import sys
+import json
+import argparse
+
+BASELINES_DIR = os.path.join('benchmarks', 'baselines')
+
+
+def load_benchmarks(only=None):
+  """Returns a list of (module_name, benchmark_class) tuples"""
+  bench_mods = sorted(f[:-3] for f in os.listdir('benchmarks')
+                      if f.endswith('_bench.py'))
+  if only:
+    bench_mods = [m for m in bench_mods if m in only]
+  benchmarks = __import__('benchmarks', fromlist=bench_mods, level=1)
+
+  found = []
+  for mod_name in bench_mods:
+    mod = getattr(benchmarks, mod_name)
+    for name in sorted(set(dir(mod))):
+      if name.endswith('Benchmarks'):
+        found.append((mod_name, getattr(mod, name)))
+  return found
+
+
+def run_benchmark(cls, name, iterations=None):
+  """Runs a single benchmark method within a fresh testbed"""
+  from benchmarks import bench_utils
+
+  bench = cls()
+  bench.setUp()
+  try:
+    stats = bench_utils.measure(getattr(bench, name),
+      iterations or cls.ITERATIONS, cls.WARMUP)
+  finally:
+    bench.tearDown()
+  # benchmarks may report additional metrics in tearDown()
+  stats.update(bench.metrics)
+  return stats
+
+
+def load_baseline(mod_name):
+  try:
+    with open(os.path.join(BASELINES_DIR, '%s.json' % mod_name)) as f:
+      return json.load(f)
+  except (IOError, ValueError):
+    return {}
+
+
+def save_baseline(mod_name, results):
+  path = os.path.join(BASELINES_DIR, '%s.json' % mod_name)
+  with open(path, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+  sys.stdout.write('>> saved %s\n' % path)
+
+
+def format_row(name, stats, baseline):
+  row = '%-44s %10.1f %9.3f %9.3f %9.1f' % (name, stats['rps'],
+    stats['p50_ms'], stats['p99_ms'], stats['allocs'])
+  if baseline:
+    delta = (stats['p50_ms'] - baseline['p50_ms']) / (baseline['p50_ms'] or 1)
+    row += ' %+8.1f%%' % (delta * 100)
+  extra = sorted(set(stats) - set(['iterations', 'total_s', 'rps',
+    'p50_ms', 'p99_ms', 'allocs']))
+  if extra:
+    row += '  ' + ' '.join('%s=%s' % (k, stats[k]) for k in extra)
+  return row
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Run app benchmarks')
+  parser.add_argument('modules', nargs='*', help='e.g. pipeline_bench')
+  parser.add_argument('--save', action='store_true',
+    help='save results as the new baselines')
+  parser.add_argument('--tolerance', type=float, default=0.25,
+    help='p50 slowdown tolerated w.r.t. the baseline, default 0.25 (25%%)')
+  parser.add_argument('-n', '--iterations', type=int,
+    help='override number of iterations of every benchmark')
+  args = parser.parse_args()
+
+  sys.stdout.write('%-44s %10s %9s %9s %9s %9s\n' % (
+    'benchmark', 'req/s', 'p50 ms', 'p99 ms', 'allocs', 'vs base'))
+
+  results = {}
+  regressions = []
+  for mod_name, cls in load_benchmarks(args.modules):
+    baseline = load_baseline(mod_name)
+    for name in cls.list_benchmarks():
+      full_name = '%s.%s' % (cls.__name__, name)
+      stats = run_benchmark(cls, name, args.iterations)
+      results.setdefault(mod_name, {})[full_name] = stats
+
+      base = baseline.get(full_name)
+      sys.stdout.write(format_row(full_name, stats, base) + '\n')
+      if base and stats['p50_ms'] > base['p50_ms'] * (1 + args.tolerance):
+        regressions.append(full_name)
+
+  if args.save:
+    for mod_name, mod_results in results.items():
+      save_baseline(mod_name, mod_results)
+
+  if regressions and not args.save:
+    sys.stderr.write('** Regressions (> %d%% slower p50): %s\n' % (
+      args.tolerance * 100, ', '.join(regressions)))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -12,16 +12,40 @@ from fmt import simple_format
 app_config = {
   'webapp2_extras.sessions': {
     'cookie_name': 'ictdays2012',
-    'secret_key': secrets.SESSION_KEY
+    'secret_key': secrets.SESSION_KEY,
+    'backends': {
+      'securecookie': 'webapp2_extras.sessions.SecureCookieSessionFactory',
+      'datastore': 'webapp2_extras.appengine.sessions_ndb.DatastoreSessionFactory',
+      'memcache': 'webapp2_extras.appengine.sessions_memcache.MemcacheSessionFactory',
+      'hybrid': 'sessions_hybrid.HybridSessionFactory'
+    },
+    # Session name => backend, see BaseHandler.get_session().
+    # Sessions not listed here are kept in secure cookies.
+    'session_backends': {
+      'ictdays2012': 'hybrid'
+    },
+    # Hybrid sessions with more JSON bytes than this spill to memcache/datastore
+    'hybrid_max_cookie_size': 1024
   },
   'webapp2_extras.i18n': {
     'default_locale': 'en',
-    'default_timezone': 'Europe/Rome'
+    'default_timezone': 'Europe/Rome',
+    # Locales negotiated from the cookie below or Accept-Language header.
+    # Catalogs of all of them are loaded on warmup requests.
+    'available_locales': ['en'],
+    'locale_cookie': 'locale',
+    # sets the negotiated locale when webapp2_extras.i18n is first used
+    'locale_selector': 'locales.select_locale'
   },
   'webapp2_extras.auth': {
     'user_model'     : 'models.User',
     'user_attributes': ['display_name', 'avatar_url'],
   },
+  # gzip compression of dynamic responses, see lib/compress.py
+  'compress': {
+    'min_size': 860,
+    'level': 6
+  },
   'webapp2_extras.jinja2': {
     'globals': { 
       'url_for' : uri_for 
@@ -34,7 +58,8 @@ app_config = {
       'extensions': [
           'jinja2.ext.autoescape',
           'jinja2.ext.with_',
-          'jinja2.ext.i18n'
+          'jinja2.ext.i18n',
+          'fragment_cache.FragmentCacheExtension'
       ]
     }
   }
@@ -50,6 +75,10 @@ def production_env():
   """
   return environ.get('SERVER_SOFTWARE', '').startswith('Google')
 
+# SERVER_SOFTWARE doesn't change during an instance lifetime,
+# so there's no need to look it up on every request.
+PRODUCTION_ENV = production_env()
+
 
-if production_env():
+if PRODUCTION_ENV:
   app_config['webapp2_extras.jinja2']['environment_args'].update(auto_reload=False)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Runtime settings which can be changed without a deploy.
+
+Values live in a single datastore entity (models.settings.Settings) and are
+cached in-process. The entity version is also stamped in memcache so that
+an instance only needs a memcache lookup, at most every REFRESH_INTERVAL
+seconds, to find out whether its copy is stale.
+
+  from conf import settings
+  ttl = settings.get('fragment_cache_ttl')
+
+  # e.g. from remote_api shell
+  settings.update(fragment_cache_ttl=600)
+"""
+import time
+import logging
+import threading
+
+# Defaults for settings missing in the datastore entity
+DEFAULTS = {
+  # feature flags go here as well, e.g. 'new_signup_flow': False
+  'fragment_cache_ttl': 3600,
+  'render_cache_ttl': 60,
+  'page_cache_ttl': 60,
+}
+
+# Max number of seconds an instance may serve settings without checking
+# the version stamp in memcache.
+REFRESH_INTERVAL = 30
+
+_VERSION_KEY = 'conf.settings:version'
+
+
+class SettingsCache(object):
+  """In-process cache of the Settings entity"""
+
+  def __init__(self, defaults, refresh_interval, clock=time.time):
+    self._defaults = dict(defaults)
+    self._refresh_interval = refresh_interval
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._values = dict(defaults)
+    self._version = None
+    self._checked_at = None
+
+  def get(self, name, default=None):
+    """Returns a setting value, refreshing the cache if it's due"""
+    self.refresh()
+    return self._values.get(name, default)
+
+  def all(self):
+    """Returns a copy of all settings"""
+    self.refresh()
+    return dict(self._values)
+
+  def refresh(self, force=False):
+    now = self._clock()
+    if not force and self._checked_at is not None and \
+        now - self._checked_at < self._refresh_interval:
+      return
+
+    with self._lock:
+      # another thread might have refreshed it while we were waiting
+      if not force and self._checked_at is not None and \
+          now - self._checked_at < self._refresh_interval:
+        return
+      try:
+        self._refresh()
+      except Exception:
+        # keep serving whatever we have, we'll retry on the next interval
+        logging.exception('Could not refresh settings')
+      self._checked_at = now
+
+  def _refresh(self):
+    from google.appengine.api import memcache
+    from models.settings import Settings
+
+    stamp = memcache.get(_VERSION_KEY)
+    if stamp is not None and stamp == self._version:
+      return
+
+    entity = Settings.get_global()
+    version = entity.version if entity else 0
+    values = dict(self._defaults)
+    if entity and entity.values:
+      values.update(entity.values)
+
+    self._values = values
+    self._version = version
+    if stamp is None:
+      memcache.add(_VERSION_KEY, version)
+
+  def update(self, **values):
+    """Stores new values in the datastore and bumps the version stamp.
+    Other instances will pick the changes up within REFRESH_INTERVAL.
+    """
+    from google.appengine.api import memcache
+    from google.appengine.ext import ndb
+    from models.settings import Settings
+
+    @ndb.transactional
+    def txn():
+      entity = Settings.get_global() or Settings(id=Settings.GLOBAL_ID)
+      entity.values = dict(entity.values or {}, **values)
+      entity.version += 1
+      entity.put()
+      return entity.version
+
+    version = txn()
+    memcache.set(_VERSION_KEY, version)
+    self.refresh(force=True)
+    return version
+
+
+_settings = SettingsCache(DEFAULTS, REFRESH_INTERVAL)
+
+get = _settings.get
+get_all = _settings.all
+update = _settings.update
+refresh = _settings.refresh
@@ -1,13 +1,68 @@
 # -*- coding: utf-8 -*-
+import os
+import re
+import copy
+import json
+import errno
+import urllib
 import logging
 
-from conf import production_env, mime_type
+from conf import PRODUCTION_ENV, mime_type, settings
 
 from webapp2 import RequestHandler, cached_property
-from webapp2_extras import jinja2, auth, sessions, jinja2, i18n
-from jinja2.runtime import TemplateNotFound
+from webapp2_extras import sessions
 
-_T = i18n.gettext
+import lazy
+import locales
+import coalesce
+import compress
+import paginate
+
+# Imported when first used, which keeps them (and Jinja2, Babel, etc.)
+# out of cold starts of requests that don't need them.
+# See tools/importprof.py
+auth = lazy.LazyModule('webapp2_extras.auth')
+i18n = lazy.LazyModule('webapp2_extras.i18n')
+jinja2 = lazy.LazyModule('webapp2_extras.jinja2')
+jinja2_exceptions = lazy.LazyModule('jinja2.exceptions')
+jsonenc = lazy.LazyModule('jsonenc')
+
+def _T(string, **variables):
+  return i18n.gettext(string, **variables)
+
+# Coalesces concurrent lookups of the same entity within the instance
+_lookups = coalesce.Coalescer()
+
+# Valid JSONP callback names, e.g. "cb" or "app.callbacks.cb_1"
+_RE_JSONP_CALLBACK = re.compile(r'^[a-zA-Z_$][\w$]*(\.[a-zA-Z_$][\w$]*)*$')
+
+# Prefix which makes JSON responses unusable as <script src>
+XSSI_PREFIX = ")]}'\n"
+
+# Assets to preload per template, written by tools/assetasm.py
+PRELOAD_MAP = '_preload.json'
+# Template name => Link header value, loaded once per instance
+_preload_headers = None
+
+def preload_header(template_dir, template):
+  """Returns a Link header value preloading assets of a template or None.
+  There are none until templates are built (see make templ).
+  """
+  global _preload_headers
+  if _preload_headers is None:
+    path = os.path.join(template_dir, PRELOAD_MAP)
+    headers = {}
+    try:
+      with open(path) as f:
+        for name, assets in json.load(f).items():
+          headers[name] = ', '.join('<%s>; rel=preload; as=%s' %
+                                    (a['url'], a['as']) for a in assets)
+    except (IOError, ValueError, KeyError, TypeError, AttributeError), e:
+      if getattr(e, 'errno', None) != errno.ENOENT:
+        logging.warning('No preload headers, bad %s: %s', path, e)
+      headers = {}
+    _preload_headers = headers
+  return _preload_headers.get(template)
 
 class BaseHandler(RequestHandler):
   def dispatch(self):
@@ -15,9 +70,9 @@ class BaseHandler(RequestHandler):
     # See this for more info on webapp2 sessions:
     # http://webapp-improved.appspot.com/api/webapp2_extras/sessions.html
     self.session_store = sessions.get_store(request=self.request)
-    
-    i18n.get_i18n().set_locale('en')
-    
+
+    # The locale isn't set here, so that requests which don't use i18n
+    # don't import it (and Babel). See locales.select_locale().
     try:
       # Dispatch the request.
       RequestHandler.dispatch(self)
@@ -25,10 +80,43 @@ class BaseHandler(RequestHandler):
       # Save all sessions.
       self.session_store.save_sessions(self.response)
 
+  @cached_property
+  def locale(self):
+    """Returns a locale negotiated from the locale cookie or Accept-Language.
+    See 'webapp2_extras.i18n' in conf/__init__.py for available locales.
+    """
+    cookie_name = self.app.config['webapp2_extras.i18n'].get('locale_cookie')
+    # responses now depend on these, e.g. for caching proxies
+    self.add_vary('Accept-Language', *(cookie_name and ['Cookie'] or []))
+    return locales.request_locale(self.request)
+
+  def add_vary(self, *headers):
+    """Adds request headers to Vary response header, unless already there"""
+    vary = [v.strip() for v in self.response.headers.get('Vary', '').split(',')
+            if v.strip()]
+    for header in headers:
+      if header.lower() not in [v.lower() for v in vary]:
+        vary.append(header)
+    self.response.headers['Vary'] = ', '.join(vary)
+
+  @cached_property
+  def catalog(self):
+    """Returns translations catalog of the current locale (cached per instance)"""
+    return locales.catalogs.get(i18n.get_store(app=self.app), self.locale)
+
   @cached_property
   def session(self):
     """Returns a session using the default cookie key"""
-    return self.session_store.get_session()
+    return self.get_session()
+
+  def get_session(self, name=None):
+    """Returns a session stored with a backend configured for its name
+    in 'session_backends' (see conf/__init__.py), secure cookie by default.
+    """
+    config = self.app.config['webapp2_extras.sessions']
+    backend = config.get('session_backends', {}).get(
+      name or config['cookie_name'], 'securecookie')
+    return self.session_store.get_session(name=name, backend=backend)
 
   @cached_property
   def auth(self):
@@ -45,41 +133,174 @@ class BaseHandler(RequestHandler):
   @cached_property
   def user(self):
     """Returns currently logged in user model object"""
-    return self.auth.store.user_model.get_by_id(self.user_dict['user_id'])
+    user_id = self.user_dict['user_id']
+    user_model = self.auth.store.user_model
+    user = _lookups.do(('user', user_id), lambda: user_model.get_by_id(user_id))
+    # the entity may be shared with concurrent requests, get our own copy
+    return user and copy.copy(user)
 
   @cached_property
   def jinja2(self):
     """Returns a Jinja2 renderer cached in the app registry"""
     return jinja2.get_jinja2(app=self.app)
     
-  def render(self, template, mime_type=mime_type.HTML, **ctx):
-    """Renders template usign Jinja2 and 'plain/html' as default Content-Type"""
+  def render_string(self, template, **ctx):
+    """Renders template into a string. Raises TemplateNotFound"""
     # some default context values
     template_ctx = {
-      'production_env': production_env()
-    } 
+      'production_env': PRODUCTION_ENV,
+      'locale': self.locale
+    }
+    # bind i18n callables to the current locale catalog
+    template_ctx.update(self.catalog.template_globals())
     # merge with passed context
     template_ctx.update(ctx)
 
+    # See this on Jinja2 templates:
+    # http://jinja.pocoo.org/docs/templates
+    return self.jinja2.render_template('%s.html' % template, **template_ctx)
+
+  def render(self, template, mime_type=mime_type.HTML, **ctx):
+    """Renders template usign Jinja2 and 'plain/html' as default Content-Type"""
     # Set headers
     self.response.headers['Content-Type'] = mime_type
 
     try:
-      # See this on Jinja2 templates:
-      # http://jinja.pocoo.org/docs/templates
-    
       # render template or respond with 404 Not found
-      template_name = '%s.html' % template
-      self.response.write(self.jinja2.render_template(template_name, **template_ctx))
-    except TemplateNotFound:
-      logging.error("Template not found: " + template_name)
+      self.response.write(self.render_string(template, **ctx))
+    except jinja2_exceptions.TemplateNotFound:
+      logging.error("Template not found: %s.html" % template)
       self.error(404)
+      return
+    self.add_preload_header(template)
+
+  def add_preload_header(self, template):
+    """Lets browsers fetch template's CSS and JS before parsing the page"""
+    config = self.app.config.get('webapp2_extras.jinja2', {})
+    links = preload_header(config.get('template_path', 'templates'),
+                           '%s.html' % template)
+    if links:
+      self.response.headers.add_header('Link', links)
+
+  def render_cached(self, template, cache_key, ttl=None,
+    mime_type=mime_type.HTML, **ctx):
+    """Same as render() but the output is cached in memcache under cache_key
+    (namespaced with app version, locale and template) for ttl seconds,
+    'render_cache_ttl' setting by default.
+
+    Only one request at a time renders an expired page, concurrent ones
+    (in this and other instances) are served the previous version meanwhile.
+    See lib/coalesce.py.
+
+    A gzipped copy is cached along with the page and served as is to
+    clients which accept it, so GzipMiddleware doesn't compress it again.
+    """
+    if ttl is None:
+      ttl = settings.get('render_cache_ttl')
+    key = 'render:%s:%s:%s:%s' % (os.environ.get('CURRENT_VERSION_ID', ''),
+                                  self.locale, template, cache_key)
+
+    def render_pair():
+      body = self.render_string(template, **ctx).encode('utf-8')
+      return body, compress.gzip_string(body)
+
+    self.response.headers['Content-Type'] = mime_type
+    try:
+      body, gzipped = coalesce.cached(key, render_pair, ttl)
+    except jinja2_exceptions.TemplateNotFound:
+      logging.error("Template not found: %s.html" % template)
+      self.error(404)
+      return
+
+    self.add_preload_header(template)
+    self.add_vary('Accept-Encoding')
+    if compress.accepts_gzip(self.request.headers.get('Accept-Encoding')):
+      self.response.headers['Content-Encoding'] = 'gzip'
+      body = gzipped
+    self.response.write(body)
+
+  def paginate(self, query, page_size=paginate.PAGE_SIZE, param='page'):
+    """Returns a paginate.Page of query, at the token of param request
+    argument. Invalid tokens (e.g. of an older query) get the first page.
+    Page windows are cached for 'page_cache_ttl' setting seconds.
+
+    Render pages with pager() macro of templates/_pagination.html.
+    """
+    token = self.request.get(param) or None
+    ttl = settings.get('page_cache_ttl')
+    try:
+      page = paginate.paginate(query, token, page_size, ttl=ttl)
+    except paginate.BadToken, e:
+      logging.debug(e)
+      page = paginate.paginate(query, None, page_size, ttl=ttl)
+
+    params = dict((k, v.encode('utf-8'))
+                  for k, v in self.request.GET.items() if k != param)
+    page.first_url = self.request.path + \
+      (params and '?' + urllib.urlencode(params) or '')
+    if page.has_next:
+      params[param] = page.next_token
+      page.next_url = '%s?%s' % (self.request.path, urllib.urlencode(params))
+    return page
+
+  def render_json(self, data, etag=None, stream=False, callback=None,
+    xssi=False):
+    """Writes data as JSON using 'application/json' Content-Type.
+    See lib/jsonenc.py for how ndb models are serialized.
+
+    Args:
+      data: plain data, ndb models or keys, or an iterable (e.g. ndb query)
+      etag: a precomputed ETag string (e.g. from an entity version) lets
+        us reply 304 Not Modified without serializing anything.
+        True computes it from the response body.
+      stream: encode lists/iterables item by item, which avoids holding
+        all items (e.g. query results) in memory at once. The response
+        body is still buffered as a whole, and md5'd with etag=True.
+      callback: JSONP callback name, responds with application/javascript
+      xssi: prefix JSON with XSSI_PREFIX
+    """
+    if isinstance(etag, basestring):
+      self.response.etag = etag
+      if etag in self.request.if_none_match:
+        self.response.status = 304
+        return
+
+    if callback is not None:
+      if not _RE_JSONP_CALLBACK.match(callback):
+        self.abort(400)
+      self.response.headers['Content-Type'] = mime_type.JS
+      self.response.write('%s(' % callback)
+    else:
+      self.response.headers['Content-Type'] = mime_type.JSON
+      if xssi:
+        self.response.write(XSSI_PREFIX)
+
+    for chunk in jsonenc.iterencode(data, stream):
+      self.response.write(chunk)
+
+    if callback is not None:
+      self.response.write(');')
+
+    if etag is True:
+      self.response.md5_etag()
+      if self.response.etag in self.request.if_none_match:
+        self.response.clear()
+        self.response.status = 304
 
   def head(self, *args, **kwargs):
     """Some external API might be upset if HEAD requests are not supported
     so we'll simply respond with an empty body and make them happy."""
     pass
 
+class WarmupHandler(BaseHandler):
+  """Handles /_ah/warmup requests (see inbound_services in app.yaml)"""
+  def get(self):
+    config = self.app.config['webapp2_extras.i18n']
+    locales.catalogs.preload(i18n.get_store(app=self.app),
+                             config['available_locales'])
+    # instantiates Jinja2 environment in the app registry
+    self.jinja2
+
 class SimpleHandler(BaseHandler):
   def get(self, templ):
     if templ in ['', '/']:
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Cron and task queue entry points of background jobs, see jobs/base.py.
+Both URL prefixes are admin-only in app.yaml.
+"""
+import logging
+
+from webapp2 import RequestHandler
+
+import jobs
+
+class StartJobHandler(RequestHandler):
+  """GET /cron/jobs/<name>, e.g. from cron.yaml"""
+  def get(self, name):
+    job = jobs.get(name)
+    if job is None:
+      self.abort(404)
+    run_id = job.start(self.request.get('run_id') or None)
+    self.response.content_type = 'text/plain'
+    self.response.write(run_id)
+
+class JobTaskHandler(RequestHandler):
+  """POST /tasks/jobs/<name>, runs a slice of a job shard.
+  Errors make the task queue retry the slice, up to job.max_retries.
+  """
+  def post(self, name):
+    job = jobs.get(name)
+    if job is None:
+      # don't let the task queue retry it forever
+      logging.error('Unknown job %r', name)
+      return
+
+    run_id = self.request.get('run_id')
+    shard = int(self.request.get('shard'))
+    slice_no = int(self.request.get('slice'))
+    retries = int(self.request.headers.get('X-AppEngine-TaskRetryCount', 0))
+
+    if retries >= job.max_retries:
+      job.fail(run_id, shard, slice_no)
+    elif not job.run_slice(run_id, shard, slice_no):
+      logging.info('Skipped stale task of job %s run %s shard %d slice %d',
+                   name, run_id, shard, slice_no)
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Registry of background jobs, see jobs/base.py"""
+import webapp2
+
+# Job name => Job subclass. Names are used in cron and task URLs.
+JOBS = {
+  'recompute_avatars': 'jobs.avatars.RecomputeAvatarsJob',
+  'index_users': 'jobs.search_index.IndexUsersJob',
+}
+
+
+def get(name):
+  """Returns a job instance or None if there's no such job"""
+  if name not in JOBS:
+    return None
+  return webapp2.import_string(JOBS[name])(name)
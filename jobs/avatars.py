@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from models.user import User, DEFAULT_AVATAR_URL, GRAVATAR_URL
+from .base import Job
+
+_GRAVATAR_PREFIX = GRAVATAR_URL.split('%s')[0]
+
+
+class RecomputeAvatarsJob(Job):
+  """Sets User.avatar_url to user's gravatar or the default avatar.
+  Avatars users set themselves are left untouched.
+  """
+
+  def query(self):
+    return User.query()
+
+  def process(self, users):
+    changed = []
+    for user in users:
+      url = user.avatar_url
+      if url and url != DEFAULT_AVATAR_URL and \
+          not url.startswith(_GRAVATAR_PREFIX):
+        continue
+      new_url = user.compute_avatar_url()
+      if new_url != url:
+        user.avatar_url = new_url
+        changed.append(user)
+    return changed
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Batched datastore jobs running on the task queue.
+
+A job run is split into shards, key ranges of the job's query processed
+in parallel. Each shard is a chain of tasks ("slices"): a slice fetches
+up to batches_per_task batches of batch_size entities, starting from the
+cursor saved in the shard's JobCheckpoint, then saves the new cursor and
+enqueues the next slice in the same transaction.
+
+Checkpoints know the number of the next slice to run, so duplicate or
+stale tasks are ignored. A failed slice is retried by the task queue
+from the last checkpoint, therefore process() must be idempotent.
+"""
+import time
+import logging
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+from google.appengine.datastore.datastore_query import Cursor
+
+import keyranges
+from models.job import JobCheckpoint
+
+# Slice tasks are POSTed here, see handlers/tasks.py
+TASK_URL = '/tasks/jobs/%s'
+
+
+class Job(object):
+  """Base class of all jobs. Subclasses implement query() and process()."""
+  # Entities fetched with each get_multi() and put with each put_multi()
+  batch_size = 100
+  # Batches processed by a single task before it chains the next one
+  batches_per_task = 10
+  # Number of key ranges to process in parallel
+  shards = 1
+  queue_name = 'default'
+  # A slice failing this many times is given up, and so is its shard
+  max_retries = 5
+
+  def __init__(self, name):
+    self.name = name
+
+  def query(self):
+    """Returns the ndb.Query of entities to process"""
+    raise NotImplementedError
+
+  def process(self, entities):
+    """Processes a batch of entities, returns those to put"""
+    raise NotImplementedError
+
+  def completed(self, run_id):
+    """Called once all shards of a run are done"""
+
+  def start(self, run_id=None):
+    """Creates shards checkpoints and enqueues their first slices.
+    Returns the run id.
+    """
+    run_id = run_id or str(int(time.time() * 1000))
+    ranges = keyranges.split(self.query(), self.shards)
+    checkpoints = []
+    for shard, (start_key, end_key) in enumerate(ranges):
+      checkpoints.append(JobCheckpoint(
+        key=JobCheckpoint.make_key(self.name, run_id, shard),
+        job=self.name, run_id=run_id, shard=shard,
+        start_key=start_key, end_key=end_key))
+    ndb.put_multi(checkpoints)
+
+    for cp in checkpoints:
+      self.enqueue(run_id, cp.shard, 0)
+    logging.info('Started job %s run %s, %d shard(s)',
+                 self.name, run_id, len(checkpoints))
+    return run_id
+
+  def enqueue(self, run_id, shard, slice_no, transactional=False):
+    params = {'run_id': run_id, 'shard': shard, 'slice': slice_no}
+    taskqueue.add(url=TASK_URL % self.name, params=params,
+                  queue_name=self.queue_name, transactional=transactional)
+
+  def run_slice(self, run_id, shard, slice_no):
+    """Processes the next slice of a shard. Returns False if the task
+    was a duplicate or the shard is already finished.
+    """
+    cp_key = JobCheckpoint.make_key(self.name, run_id, shard)
+    cp = cp_key.get(use_cache=False, use_memcache=False)
+    if not self._is_current(cp, slice_no):
+      return False
+
+    query = keyranges.restrict(self.query(), cp.start_key, cp.end_key)
+    cursor = cp.cursor and Cursor(urlsafe=cp.cursor)
+    processed, more = 0, True
+    for _ in xrange(self.batches_per_task):
+      keys, cursor, more = query.fetch_page(
+        self.batch_size, start_cursor=cursor, keys_only=True)
+      entities = [e for e in ndb.get_multi(keys) if e is not None]
+      if entities:
+        ndb.put_multi(self.process(entities) or [])
+      processed += len(keys)
+      if not more or not cursor:
+        more = False
+        break
+
+    if not self._checkpoint(cp_key, slice_no, cursor, processed, more):
+      return False
+    if not more and self._all_done(run_id):
+      self.completed(run_id)
+    return True
+
+  @ndb.transactional
+  def _checkpoint(self, cp_key, slice_no, cursor, processed, more):
+    cp = cp_key.get()
+    if not self._is_current(cp, slice_no):
+      # another task got here first, its results stand
+      return False
+    cp.slice = slice_no + 1
+    cp.cursor = cursor and cursor.urlsafe()
+    cp.processed += processed
+    cp.done = not more
+    cp.put()
+    if more:
+      self.enqueue(cp.run_id, cp.shard, cp.slice, transactional=True)
+    else:
+      logging.info('Job %s run %s shard %d done, %d entities',
+                   self.name, cp.run_id, cp.shard, cp.processed)
+    return True
+
+  def fail(self, run_id, shard, slice_no):
+    """Gives up a shard"""
+    cp = JobCheckpoint.make_key(self.name, run_id, shard).get()
+    if self._is_current(cp, slice_no):
+      cp.failed = True
+      cp.put()
+    logging.error('Job %s run %s shard %d failed at slice %d',
+                  self.name, run_id, shard, slice_no)
+
+  def status(self, run_id):
+    """Returns checkpoints of all shards of a run"""
+    return JobCheckpoint.query(JobCheckpoint.job == self.name,
+                               JobCheckpoint.run_id == run_id).fetch()
+
+  def _all_done(self, run_id):
+    # entities, not the (eventually consistent) query results: shards
+    # finishing at the same time must see each other done
+    keys = JobCheckpoint.query(JobCheckpoint.job == self.name,
+                               JobCheckpoint.run_id == run_id).fetch(
+                                 keys_only=True)
+    checkpoints = ndb.get_multi(keys, use_cache=False, use_memcache=False)
+    return all(cp and cp.done for cp in checkpoints)
+
+  def _is_current(self, cp, slice_no):
+    return cp is not None and not cp.done and not cp.failed and \
+      cp.slice == slice_no
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from models import search
+from models.user import User
+from .base import Job
+
+
+class IndexUsersJob(Job):
+  """(Re)builds search index of all users, e.g. for users put before
+  models/search.py existed or after a tokens format change.
+  """
+
+  def query(self):
+    return User.query()
+
+  def process(self, users):
+    return [search.index_entity(user) for user in users]
+
+  def completed(self, run_id):
+    search.invalidate()
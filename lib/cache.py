@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""In-process LRU cache and a two-level (LRU + memcache) cache on top of it."""
+import time
+import threading
+from collections import OrderedDict
+
+from google.appengine.api import memcache
+
+# Marker for cache misses, so that None (and False) can be cached too
+MISS = object()
+
+
+class LRUCache(object):
+  """Thread-safe, size-bound in-process cache with optional per-item TTL"""
+
+  def __init__(self, size=1000, clock=time.time):
+    self.size = size
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._data = OrderedDict()
+
+  def get(self, key, default=MISS):
+    with self._lock:
+      try:
+        value, expires = self._data.pop(key)
+      except KeyError:
+        return default
+      if expires and expires <= self._clock():
+        return default
+      # re-insert to mark as the most recently used
+      self._data[key] = (value, expires)
+      return value
+
+  def set(self, key, value, ttl=0):
+    expires = ttl and self._clock() + ttl or 0
+    with self._lock:
+      self._data.pop(key, None)
+      self._data[key] = (value, expires)
+      while len(self._data) > self.size:
+        self._data.popitem(last=False)
+
+  def delete(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+  def __len__(self):
+    return len(self._data)
+
+
+class TwoLevelCache(object):
+  """Looks up values in an in-process LRU first, then in memcache.
+
+  Values found in memcache are copied into the LRU. Keys are prefixed
+  with namespace in memcache. In-process entries can be given a shorter
+  TTL (local_ttl) than memcache ones, which bounds how long other instances
+  may keep serving a value after it has been changed or deleted here.
+
+  Values are stored in memcache along with their expiration time, so that
+  the LRU copy never outlives the memcache one.
+
+  Values which must never be stale, e.g. those a delete on another instance
+  has to revoke at once, can be kept out of the LRU altogether: keep_local
+  is a callable which returns False for them.
+  """
+  def __init__(self, namespace, size=1000, local_ttl=0, clock=time.time,
+    keep_local=None):
+    self.namespace = namespace
+    self.local_ttl = local_ttl
+    self.keep_local = keep_local
+    self.lru = LRUCache(size, clock=clock)
+    self._clock = clock
+    self.hits = 0
+    self.memcache_hits = 0
+    self.misses = 0
+
+  def _key(self, key):
+    return '%s:%s' % (self.namespace, key)
+
+  def _local_ttl(self, ttl):
+    if self.local_ttl and ttl:
+      return min(self.local_ttl, ttl)
+    return self.local_ttl or ttl
+
+  def get(self, key, default=MISS):
+    value = self.lru.get(key)
+    if value is not MISS:
+      self.hits += 1
+      return value
+
+    cached = memcache.get(self._key(key))
+    if cached is None:
+      self.misses += 1
+      return default
+    self.memcache_hits += 1
+    value, expires = cached
+    ttl = expires and max(expires - self._clock(), 0.001) or 0
+    self._set_local(key, value, ttl)
+    return value
+
+  def set(self, key, value, ttl=0):
+    expires = ttl and self._clock() + ttl or 0
+    self._set_local(key, value, ttl)
+    memcache.set(self._key(key), (value, expires), time=ttl)
+
+  def add(self, key, value, ttl=0):
+    """Caches value unless another one got into memcache meanwhile, e.g.
+    set by a concurrent request. Returns whichever value is cached.
+    Use it to fill cache misses with values read from the datastore.
+    """
+    expires = ttl and self._clock() + ttl or 0
+    if not memcache.add(self._key(key), (value, expires), time=ttl):
+      cached = memcache.get(self._key(key))
+      if cached is not None:
+        value, expires = cached
+        ttl = expires and max(expires - self._clock(), 0.001) or 0
+    self._set_local(key, value, ttl)
+    return value
+
+  def _set_local(self, key, value, ttl):
+    if self.keep_local is None or self.keep_local(value):
+      self.lru.set(key, value, self._local_ttl(ttl))
+    else:
+      self.lru.delete(key)
+
+  def delete(self, key):
+    self.lru.delete(key)
+    memcache.delete(self._key(key))
+
+  def get_or_set(self, key, func, ttl=0):
+    """Returns a cached value or caches and returns what func() returns"""
+    value = self.get(key)
+    if value is MISS:
+      value = func()
+      self.set(key, value, ttl)
+    return value
+
+  def reset_stats(self):
+    self.hits = self.memcache_hits = self.misses = 0
+
+  def stats(self):
+    total = self.hits + self.memcache_hits + self.misses
+    return {
+      'hits': self.hits,
+      'memcache_hits': self.memcache_hits,
+      'misses': self.misses,
+      'hit_rate': total and float(self.hits + self.memcache_hits) / total,
+    }
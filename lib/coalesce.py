@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Dogpile protection for expensive computations.
+
+Coalescer makes concurrent callers within an instance (threadsafe: yes)
+share a single computation of the same key.
+
+cached() adds memcache on top of that: a value is served fresh for ttl
+seconds, then stale for another stale_ttl seconds while exactly one caller
+across all instances (the one holding a memcache lease) recomputes it.
+"""
+import sys
+import time
+import threading
+
+from google.appengine.api import memcache
+
+
+class _Call(object):
+  def __init__(self):
+    self.event = threading.Event()
+    self.result = None
+    self.exc_info = None
+
+
+class Coalescer(object):
+  """Runs at most one computation per key at a time.
+
+  Callers which arrive while a computation of the same key is in flight
+  wait for it and get the same result (or exception). Results are shared
+  between threads, so treat them as read-only.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._calls = {}
+
+  def do(self, key, func):
+    with self._lock:
+      call = self._calls.get(key)
+      leader = call is None
+      if leader:
+        call = self._calls[key] = _Call()
+
+    if not leader:
+      call.event.wait()
+      if call.exc_info:
+        raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+      return call.result
+
+    try:
+      call.result = func()
+    except Exception:
+      call.exc_info = sys.exc_info()
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+      call.event.set()
+    return call.result
+
+
+_coalescer = Coalescer()
+
+# How long (seconds) a lease to recompute a value is held at most
+LEASE_TTL = 10
+# When nothing is cached and another instance holds the lease, poll
+# memcache for its result this many times before computing it ourselves
+LEASE_WAIT_POLLS = 20
+LEASE_WAIT_INTERVAL = 0.05
+
+
+def cached(key, func, ttl, stale_ttl=None, coalescer=_coalescer):
+  """Returns func() result cached in memcache under key.
+
+  Args:
+    key: memcache key
+    func: computes the value, which must be picklable
+    ttl: seconds the value is considered fresh
+    stale_ttl: seconds an expired value can still be served while it's
+      being recomputed, defaults to ttl
+  """
+  if stale_ttl is None:
+    stale_ttl = ttl
+  lease_key = '%s:lease' % key
+
+  entry = memcache.get(key)
+  if entry is not None:
+    value, fresh_until = entry
+    if fresh_until > time.time():
+      return value
+    # stale: whoever gets the lease recomputes, everybody else
+    # keeps on serving the stale value in the meantime
+    if memcache.add(lease_key, 1, time=LEASE_TTL):
+      try:
+        return coalescer.do(key, lambda: _store(key, func, ttl, stale_ttl))
+      finally:
+        memcache.delete(lease_key)
+    return value
+
+  def compute():
+    leased = memcache.add(lease_key, 1, time=LEASE_TTL)
+    if not leased:
+      # another instance is computing it, give it a chance to finish
+      for _ in xrange(LEASE_WAIT_POLLS):
+        time.sleep(LEASE_WAIT_INTERVAL)
+        entry = memcache.get(key)
+        if entry is not None:
+          return entry[0]
+    try:
+      return _store(key, func, ttl, stale_ttl)
+    finally:
+      if leased:
+        memcache.delete(lease_key)
+
+  return coalescer.do(key, compute)
+
+
+def _store(key, func, ttl, stale_ttl):
+  value = func()
+  memcache.set(key, (value, time.time() + ttl), time=ttl + stale_ttl)
+  return value
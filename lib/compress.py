@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""On-the-fly gzip compression of dynamic responses.
+
+GzipMiddleware compresses text responses of a WSGI app when a client
+accepts gzip, chunk by chunk as the app yields them. Responses smaller
+than min_size, non-text or already encoded ones are passed through as is.
+ETags of compressed responses are made weak (see weak_etag()). Every
+text response gets "Vary: Accept-Encoding", whether it's compressed or not.
+"""
+import re
+import zlib
+import itertools
+
+# Compressing less than this many bytes isn't worth it
+MIN_SIZE = 860
+# zlib compression level, 1 (fastest) to 9 (smallest)
+LEVEL = 6
+
+_RE_COMPRESSIBLE = re.compile(
+  r'^(text/|application/(json|javascript|x-javascript|xml|atom\+xml|rss\+xml))')
+
+
+def accepts_gzip(accept_encoding):
+  """True if an Accept-Encoding header value allows gzip"""
+  for coding in (accept_encoding or '').split(','):
+    params = coding.split(';')
+    if params[0].strip().lower() not in ('gzip', 'x-gzip', '*'):
+      continue
+    q = 1.0
+    for param in params[1:]:
+      param = param.strip()
+      if param.startswith('q='):
+        try:
+          q = float(param[2:])
+        except ValueError:
+          q = 0
+    if q > 0:
+      return True
+  return False
+
+
+def gzip_chunks(chunks, level=LEVEL):
+  """Yields gzip-compressed chunks of data"""
+  compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+  for chunk in chunks:
+    data = compressor.compress(chunk)
+    if data:
+      yield data
+  yield compressor.flush()
+
+
+def gzip_string(data, level=LEVEL):
+  return ''.join(gzip_chunks([data], level))
+
+
+def weak_etag(headers):
+  """Makes a strong ETag of response headers weak.
+
+  Compressed and identity responses mustn't share a strong ETag, but a weak
+  one is fine. Apps still match it with If-None-Match as is (webob ignores
+  the W/ prefix there), so they don't need to know about compression.
+  """
+  return [(k, k.lower() == 'etag' and not v.startswith('W/') and 'W/' + v or v)
+          for k, v in headers]
+
+
+def vary(headers, name):
+  """Adds a request header name to the Vary header(s) of response headers,
+  merged into a single one
+  """
+  values, others = [], []
+  for k, v in headers:
+    if k.lower() == 'vary':
+      values.extend(x.strip() for x in v.split(',') if x.strip())
+    else:
+      others.append((k, v))
+  if name.lower() not in [v.lower() for v in values] and '*' not in values:
+    values.append(name)
+  return others + [('Vary', ', '.join(values))]
+
+
+def _iter_and_close(chunks, app_iter):
+  """Makes sure app_iter.close() is called, as WSGI requires"""
+  try:
+    for chunk in chunks:
+      yield chunk
+  finally:
+    if hasattr(app_iter, 'close'):
+      app_iter.close()
+
+
+class GzipMiddleware(object):
+  """WSGI middleware, see module description"""
+
+  def __init__(self, app, min_size=MIN_SIZE, level=LEVEL):
+    self.app = app
+    self.min_size = min_size
+    self.level = level
+
+  def __call__(self, environ, start_response):
+    if environ.get('REQUEST_METHOD') == 'HEAD' or \
+        not accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING')):
+      def _start_identity(status, headers, exc_info=None):
+        # caches mustn't serve it to clients which accept gzip
+        if self._compressible_type(headers):
+          headers = vary(headers, 'Accept-Encoding')
+        return start_response(status, headers, exc_info)
+      return self.app(environ, _start_identity)
+
+    captured = []
+    written = []
+    def _start_response(status, headers, exc_info=None):
+      captured[:] = [status, headers, exc_info]
+      return written.append
+
+    app_iter = self.app(environ, _start_response)
+
+    # buffer just enough to decide whether it's worth compressing
+    buffered = written
+    size = sum(len(c) for c in buffered)
+    rest = iter(app_iter)
+    for chunk in rest:
+      buffered.append(chunk)
+      size += len(chunk)
+      if size >= self.min_size:
+        break
+
+    status, headers, exc_info = captured
+    chunks = itertools.chain(buffered, rest)
+    if self._compressible_type(headers):
+      headers = vary(headers, 'Accept-Encoding')
+    if size < self.min_size or not self._should_compress(status, headers):
+      # the client has the compressed version, see weak_etag()
+      if status.startswith('304') and \
+          'W/' in environ.get('HTTP_IF_NONE_MATCH', ''):
+        headers = weak_etag(headers)
+      start_response(status, headers, exc_info)
+      return _iter_and_close(chunks, app_iter)
+
+    headers = [(k, v) for k, v in headers if k.lower() != 'content-length']
+    headers = weak_etag(headers)
+    headers.append(('Content-Encoding', 'gzip'))
+    start_response(status, headers, exc_info)
+    return _iter_and_close(gzip_chunks(chunks, self.level), app_iter)
+
+  def _should_compress(self, status, headers):
+    code = int(status.split(' ', 1)[0])
+    if code < 200 or code in (204, 206, 304):
+      return False
+    for name, value in headers:
+      if name.lower() == 'content-encoding':
+        return False
+    return self._compressible_type(headers)
+
+  def _compressible_type(self, headers):
+    for name, value in headers:
+      if name.lower() == 'content-type':
+        return bool(_RE_COMPRESSIBLE.match(value))
+    return False
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Fragment caching tag for Jinja2 templates:
+
+  {% cache 'home-help' %}...{% endcache %}
+  {% cache 'sidebar-' ~ user.key.id(), 600 %}...{% endcache %}
+
+Rendered fragments are stored in an in-process LRU and memcache
+(see lib/cache.py). Keys are namespaced with the app version and
+'locale' of the template context, so a new deployment or a different
+locale never gets a stale fragment. TTL defaults to 'fragment_cache_ttl'
+runtime setting (see conf/settings.py).
+
+Enable it with 'fragment_cache.FragmentCacheExtension' in
+'environment_args' / 'extensions' of 'webapp2_extras.jinja2' config.
+"""
+import os
+
+from jinja2 import nodes, Markup
+from jinja2.ext import Extension
+
+import cache
+
+fragments = cache.TwoLevelCache('fragment', size=500)
+
+
+class FragmentCacheExtension(Extension):
+  tags = set(['cache'])
+
+  def parse(self, parser):
+    lineno = parser.stream.next().lineno
+
+    args = [parser.parse_expression()]
+    if parser.stream.skip_if('comma'):
+      args.append(parser.parse_expression())
+    else:
+      args.append(nodes.Const(None))
+    args.append(nodes.ContextReference())
+
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    return nodes.CallBlock(self.call_method('_cache_support', args),
+                           [], [], body).set_lineno(lineno)
+
+  def _cache_support(self, name, ttl, context, caller):
+    key = '%s:%s:%s' % (os.environ.get('CURRENT_VERSION_ID', ''),
+                        context.get('locale', ''), name)
+    rv = fragments.get(key)
+    if rv is cache.MISS:
+      rv = caller()
+      if ttl is None:
+        from conf import settings
+        ttl = settings.get('fragment_cache_ttl')
+      fragments.set(key, unicode(rv), ttl)
+    return Markup(rv)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""JSON encoding of plain data and ndb models.
+
+Objects with a to_json() method (e.g. models.User) are encoded with
+whatever it returns, other ndb models with to_dict() plus their key id.
+"""
+import datetime
+
+try:
+  # simplejson C speedups are faster than stdlib json, when available
+  import simplejson as json
+except ImportError:
+  import json
+
+from google.appengine.ext import ndb
+
+
+def to_plain(obj):
+  """Converts objects json can't handle, used as JSONEncoder's default"""
+  if hasattr(obj, 'to_json'):
+    return obj.to_json()
+  if isinstance(obj, ndb.Model):
+    data = obj.to_dict()
+    data['id'] = obj.key and obj.key.id()
+    return data
+  if isinstance(obj, ndb.Key):
+    return obj.urlsafe()
+  if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+    return obj.isoformat()
+  if hasattr(obj, '__iter__'):
+    # sets, generators, query iterators
+    return list(obj)
+  raise TypeError('%r is not JSON serializable' % obj)
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'), default=to_plain)
+
+
+def dumps(obj):
+  """Compact JSON representation of obj"""
+  return _encoder.encode(obj)
+
+
+def iterencode(obj, stream=False):
+  """Yields JSON chunks of obj.
+
+  With stream=True, lists and other iterables (e.g. an ndb query) are
+  encoded item by item, so that all of their items (entities or their
+  to_dict() copies) are never held in memory at once. The JSON output
+  itself still is, if chunks are written to a buffered webapp2 Response.
+  """
+  if not stream or isinstance(obj, (dict, basestring)) or \
+      not hasattr(obj, '__iter__'):
+    yield dumps(obj)
+    return
+
+  yield '['
+  first = True
+  for item in obj:
+    if first:
+      first = False
+      yield dumps(item)
+    else:
+      yield ',' + dumps(item)
+  yield ']'
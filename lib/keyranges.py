@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Splitting of a query keyspace into key ranges, e.g. to process
+a kind in parallel shards.
+"""
+from google.appengine.ext import ndb
+from google.appengine.datastore import datastore_query
+
+# Number of scatter keys fetched per wanted range. More is more even.
+OVERSAMPLING = 32
+
+_KEY_ORDER = datastore_query.PropertyOrder('__key__')
+_SCATTER_ORDER = datastore_query.PropertyOrder('__scatter__')
+
+
+def split(query, count):
+  """Returns up to count (start_key, end_key) tuples covering query keyspace.
+
+  Split points are picked among __scatter__ keys, a random sample of
+  entities the datastore maintains. None stands for an open end.
+  Falls back to a single range if there are no scatter keys
+  (e.g. with the dev server or testbed stubs).
+  """
+  if count <= 1:
+    return [(None, None)]
+
+  scatter = ndb.Query(kind=query.kind, namespace=query.namespace) \
+    .order(_SCATTER_ORDER) \
+    .fetch(count * OVERSAMPLING, keys_only=True)
+  if len(scatter) < count:
+    return [(None, None)]
+
+  scatter.sort()
+  step = len(scatter) / float(count)
+  points = [scatter[int(i * step)] for i in range(1, count)]
+  bounds = [None] + points + [None]
+  return zip(bounds[:-1], bounds[1:])
+
+
+def restrict(query, start_key=None, end_key=None):
+  """Returns query restricted to [start_key, end_key), ordered by key"""
+  if start_key:
+    query = query.filter(ndb.query.FilterNode('__key__', '>=', start_key))
+  if end_key:
+    query = query.filter(ndb.query.FilterNode('__key__', '<', end_key))
+  return query.order(_KEY_ORDER)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Deferred imports, to keep heavy modules off the cold start path.
+
+  auth = LazyModule('webapp2_extras.auth')
+  ...
+  auth.get_auth()  # webapp2_extras.auth is imported here, once
+
+See tools/importprof.py for what's worth deferring.
+"""
+import sys
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule(object):
+  """Stands for a module, which is imported on first attribute access"""
+
+  def __init__(self, name):
+    self.__dict__['_name'] = name
+    self.__dict__['_module'] = None
+
+  def _load(self):
+    module = self.__dict__['_module']
+    if module is None:
+      with _lock:
+        module = self.__dict__['_module']
+        if module is None:
+          __import__(self._name)
+          module = self.__dict__['_module'] = sys.modules[self._name]
+    return module
+
+  def __getattr__(self, attr):
+    return getattr(self._load(), attr)
+
+  def __setattr__(self, attr, value):
+    setattr(self._load(), attr, value)
+
+  def __repr__(self):
+    state = 'loaded' if self.__dict__['_module'] else 'not loaded'
+    return '<lazy module %r, %s>' % (self._name, state)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Per-request locale negotiation and a per-instance cache of
+compiled (babel_compile) gettext catalogs.
+"""
+import threading
+
+
+def negotiate(request, available, default, cookie_name=None):
+  """Returns the best locale for a request out of available ones.
+
+  A locale stored in cookie_name wins over Accept-Language header.
+  Falls back to default if there's no match.
+  """
+  if cookie_name:
+    locale = request.cookies.get(cookie_name)
+    if locale in available:
+      return locale
+
+  if 'Accept-Language' in request.headers:
+    return request.accept_language.best_match(available,
+                                              default_match=default)
+  return default
+
+
+def request_locale(request):
+  """Negotiates a locale of a request as configured in 'webapp2_extras.i18n'
+  (see conf/__init__.py)
+  """
+  config = request.app.config['webapp2_extras.i18n']
+  return negotiate(request, config['available_locales'],
+                   config['default_locale'], config.get('locale_cookie'))
+
+
+def select_locale(store, request):
+  """'locale_selector' of webapp2_extras.i18n, so that a request's I18n
+  object gets the negotiated locale when it's first used, e.g. by _T()
+  """
+  return request_locale(request)
+
+
+class Catalog(object):
+  """Memoizes message lookups of a gettext translations object.
+
+  Rendered templates ask for the same messages over and over again,
+  so after the first render of a page in a locale every lookup is a dict hit.
+  """
+  def __init__(self, locale, translations):
+    self.locale = locale
+    self.translations = translations
+    self._messages = {}
+    self._template_globals = None
+
+  def gettext(self, string):
+    try:
+      return self._messages[string]
+    except KeyError:
+      msg = self._messages[string] = self.translations.ugettext(string)
+      return msg
+
+  def ngettext(self, singular, plural, n):
+    return self.translations.ungettext(singular, plural, n)
+
+  def template_globals(self):
+    """Returns gettext callables for Jinja2 i18n extension bound to this
+    catalog, so that templates don't need to look up current request
+    locale on every message. Built once per catalog.
+    """
+    if self._template_globals is None:
+      # not imported at module level, see handlers/base.py
+      from jinja2.ext import _make_new_gettext, _make_new_ngettext
+      self._template_globals = {
+        'gettext': _make_new_gettext(self.gettext),
+        'ngettext': _make_new_ngettext(self.ngettext),
+      }
+    return self._template_globals
+
+
+class Catalogs(object):
+  """All catalogs of an instance, shared between requests (and threads)"""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._catalogs = {}
+
+  def get(self, store, locale):
+    """Returns a Catalog of a locale, loading it from webapp2_extras.i18n
+    I18nStore if this is the first time locale is requested.
+    """
+    catalog = self._catalogs.get(locale)
+    if catalog is None:
+      with self._lock:
+        catalog = self._catalogs.get(locale)
+        if catalog is None:
+          catalog = Catalog(locale, store.get_translations(locale))
+          self._catalogs[locale] = catalog
+    return catalog
+
+  def preload(self, store, locales):
+    """Loads catalogs of all locales, e.g. during a warmup request"""
+    for locale in locales:
+      self.get(store, locale)
+
+  def clear(self):
+    with self._lock:
+      self._catalogs = {}
+
+
+catalogs = Catalogs()
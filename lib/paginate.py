@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Cursor-based pagination of ndb queries, with cached page windows.
+
+Pages are addressed by opaque URL-safe tokens (a query cursor prefixed
+with a fingerprint of the query) instead of offsets, so that page 100
+costs the same as page 1. A query fetches the keys of `window` pages at
+once. They are cached in memcache per page token, so following "next"
+links or reloading a page skips the query altogether. Entities are then
+read with get_multi(), which ndb serves from its own caches when it can.
+
+Cached windows may miss entities created during the last `ttl` seconds.
+Entities deleted in the meantime are left out of their page.
+
+  page = paginate(User.query().order(User.display_name), token, page_size=20)
+  page.items, page.next_token
+"""
+import hashlib
+
+from google.appengine.api import datastore_errors, memcache
+from google.appengine.ext import ndb
+from google.appengine.datastore.datastore_query import Cursor
+
+PAGE_SIZE = 20
+# Number of pages fetched (and cached) with a single query
+WINDOW = 3
+MEMCACHE_PREFIX = 'paginate:'
+# Length of the query fingerprint prefixed to tokens
+_FP_LEN = 8
+
+
+class BadToken(ValueError):
+  """Page token isn't valid for a query"""
+
+
+class Page(object):
+  """A page of entities. token is None for the first page."""
+
+  def __init__(self, items, token, next_token):
+    self.items = items
+    self.token = token
+    self.next_token = next_token
+    # set by BaseHandler.paginate()
+    self.first_url = None
+    self.next_url = None
+
+  @property
+  def has_next(self):
+    return self.next_token is not None
+
+  @property
+  def is_first(self):
+    return self.token is None
+
+  def __iter__(self):
+    return iter(self.items)
+
+  def __len__(self):
+    return len(self.items)
+
+
+def fingerprint(query, page_size):
+  """Identifies a query (and page size) in tokens and cache keys"""
+  return hashlib.md5('%r:%d' % (query, page_size)).hexdigest()[:_FP_LEN]
+
+
+def encode_token(fp, cursor):
+  return fp + cursor.urlsafe()
+
+
+def decode_token(fp, token):
+  """Returns a Cursor. Raises BadToken"""
+  if not token.startswith(fp):
+    raise BadToken('Token of another query: %r' % token)
+  try:
+    return Cursor(urlsafe=token[len(fp):])
+  except Exception:
+    raise BadToken('Malformed token: %r' % token)
+
+
+def _cache_key(fp, token):
+  # tokens may be too long for memcache keys
+  return '%s:%s' % (fp, token and hashlib.md5(token).hexdigest() or '')
+
+
+def fetch_window(query, cursor, page_size, window):
+  """Returns a list of (keys, next_cursor) of up to window pages.
+  next_cursor of the last page is None if there are no more entities.
+  Raises BadToken if the datastore rejects cursor.
+  """
+  results = query.iter(start_cursor=cursor, keys_only=True,
+                       produce_cursors=True, limit=page_size * window + 1)
+  pages, keys = [], []
+  try:
+    for key in results:
+      if len(keys) == page_size:
+        pages.append((keys, results.cursor_before()))
+        keys = []
+        if len(pages) == window:
+          return pages
+      keys.append(key)
+  except (datastore_errors.BadRequestError,
+          datastore_errors.BadArgumentError), e:
+    # a well-formed cursor, but not one of this query
+    if cursor is None:
+      raise
+    raise BadToken('Invalid cursor: %s' % e)
+  pages.append((keys, None))
+  return pages
+
+
+def paginate(query, token=None, page_size=PAGE_SIZE, window=WINDOW, ttl=60):
+  """Returns a Page of query starting at token. Raises BadToken"""
+  fp = fingerprint(query, page_size)
+  cursor = token and decode_token(fp, token)
+  cached = memcache.get(_cache_key(fp, token), key_prefix=MEMCACHE_PREFIX)
+  if cached is None:
+    pages, cache = fetch_window(query, cursor, page_size, window), {}
+    page_token = token
+    for keys, next_cursor in pages:
+      next_token = next_cursor and encode_token(fp, next_cursor)
+      cache[_cache_key(fp, page_token)] = (keys, next_token)
+      page_token = next_token
+    if ttl:
+      memcache.set_multi(cache, ttl, key_prefix=MEMCACHE_PREFIX)
+    cached = cache[_cache_key(fp, token)]
+
+  keys, next_token = cached
+  items = [e for e in ndb.get_multi(keys) if e is not None]
+  return Page(items, token, next_token)
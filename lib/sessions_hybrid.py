@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Hybrid session backend for webapp2_extras.sessions.
+
+Small sessions are stored in a signed cookie, just like the default
+'securecookie' backend. Once a session gets larger than
+'hybrid_max_cookie_size' (bytes of JSON), its data is moved to memcache
+with a datastore backup (webapp2_extras' sessions_ndb.Session) and the
+cookie only carries a session id. If the session shrinks again, it
+moves back into the cookie.
+
+Register it in 'webapp2_extras.sessions' config:
+
+  'backends': {
+    ...
+    'hybrid': 'sessions_hybrid.HybridSessionFactory',
+  }
+
+and pick it per session name with 'session_backends' (see
+BaseHandler.get_session()).
+"""
+import json
+
+from webapp2_extras import sessions
+from webapp2_extras.appengine import sessions_ndb
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+# Default max size of a session kept in the cookie
+MAX_COOKIE_SIZE = 1024
+
+_SID_KEY = '_sid'
+
+
+class HybridSessionFactory(sessions.CustomBackendSessionFactory):
+  session_model = sessions_ndb.Session
+
+  sid = None
+
+  def get_session(self, max_age=sessions.DEFAULT_VALUE):
+    if self.session is None:
+      data = self.session_store.get_secure_cookie(self.name, max_age=max_age)
+      if data and data.keys() == [_SID_KEY]:
+        sid = data[_SID_KEY]
+        data = None
+        if self._is_valid_sid(sid):
+          self.sid = sid
+          data = self.session_model.get_by_sid(sid)
+
+      self.session = self.session_class(self, data=data, new=data is None)
+    return self.session
+
+  def save_session(self, response):
+    if self.session is None or not self.session.modified:
+      return
+
+    data = dict(self.session)
+    cookie_args = self.session_store.config['cookie_args']
+    if self._fits_cookie(data):
+      if self.sid:
+        # the session shrunk, no need to keep it in the backend anymore
+        self._delete_sid(self.sid)
+        self.sid = None
+    else:
+      if not self.sid:
+        self.sid = self._get_new_sid()
+      self.session_model(id=self.sid, data=data)._put()
+      data = {_SID_KEY: self.sid}
+
+    self.session_store.save_secure_cookie(
+      response, self.name, data, **cookie_args)
+
+  def _fits_cookie(self, data):
+    max_size = self.session_store.config.get('hybrid_max_cookie_size',
+                                             MAX_COOKIE_SIZE)
+    return len(json.dumps(data, separators=(',', ':'))) <= max_size
+
+  def _delete_sid(self, sid):
+    memcache.delete(sid)
+    ndb.Key(self.session_model, sid).delete()
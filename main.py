@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
 import sys
-from conf import app_config, production_env
+from conf import app_config, PRODUCTION_ENV
 
 from webapp2 import WSGIApplication, Route
+from compress import GzipMiddleware
 
 # Define URLs to handlers mapping here
 routes = [
+	Route('/_ah/warmup', handler='handlers.base.WarmupHandler'),
+	Route('/cron/jobs/<name>', handler='handlers.tasks.StartJobHandler'),
+	Route('/tasks/jobs/<name>', handler='handlers.tasks.JobTaskHandler'),
 	Route('/<:.*>', handler='handlers.base.SimpleHandler')
 ]
 
-app = WSGIApplication(routes, config=app_config, debug=not(production_env()))
+webapp = WSGIApplication(routes, config=app_config, debug=not PRODUCTION_ENV)
 # TODO: set 404 and 500 error handlers, e.g.
-# app.error_handlers[404] = ...
-# app.error_handlers[500] = ...
+# webapp.error_handlers[404] = ...
+# webapp.error_handlers[500] = ...
+
+# This is what app.yaml refers to
+app = GzipMiddleware(webapp, **app_config['compress'])
@@ -1,3 +1,6 @@
 # -*- coding: utf-8 -*-
 
 """Apps' models module."""
+
+# 'webapp2_extras.auth' config refers to it as models.User
+from .user import User
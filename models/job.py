@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from google.appengine.ext import ndb
+
+class JobCheckpoint(ndb.Model):
+  """Progress of a job shard, see jobs/base.py.
+  Key id is "<job name>:<run id>:<shard>".
+  """
+  job       = ndb.StringProperty(required=True)
+  run_id    = ndb.StringProperty(required=True)
+  shard     = ndb.IntegerProperty(required=True)
+  # number of the next task slice to run, guards against duplicate tasks
+  slice     = ndb.IntegerProperty(default=0, indexed=False)
+  cursor    = ndb.StringProperty(indexed=False)
+  start_key = ndb.KeyProperty(indexed=False)
+  end_key   = ndb.KeyProperty(indexed=False)
+  processed = ndb.IntegerProperty(default=0, indexed=False)
+  done      = ndb.BooleanProperty(default=False)
+  failed    = ndb.BooleanProperty(default=False)
+  updated   = ndb.DateTimeProperty(auto_now=True)
+
+  @classmethod
+  def make_key(cls, job, run_id, shard):
+    return ndb.Key(cls, '%s:%s:%d' % (job, run_id, shard))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Prefix search of users by display_name, e.g. for autocomplete.
+
+Every User put also writes a UserSearchIndex entity (same id) with all
+prefixes of the normalized words of display_name (see User._put_async),
+unless they didn't change. A query matches users having a word starting
+with each of the query words, which is a keys-only AND query on the tokens.
+Results are cached in memcache until any user's tokens change, tracked by
+a generation counter.
+"""
+import re
+import time
+import hashlib
+import unicodedata
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from . import summary
+
+# Longer words are only indexed up to this many chars
+MAX_PREFIX_LEN = 20
+DEFAULT_LIMIT = 10
+RESULTS_TTL = 3600
+GENERATION_KEY = 'user_search:generation'
+
+_RE_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+class UserSearchIndex(ndb.Model):
+  """Derived from User, never write it directly. Key id is User's id."""
+  _use_cache = False
+  _use_memcache = False
+
+  tokens = ndb.StringProperty(repeated=True)
+
+
+def words(text):
+  """Lowercased words of text, without accents"""
+  if not isinstance(text, unicode):
+    text = (text or '').decode('utf-8')
+  text = unicodedata.normalize('NFKD', text.lower())
+  text = u''.join(c for c in text if not unicodedata.combining(c))
+  return [w[:MAX_PREFIX_LEN] for w in _RE_WORD.findall(text)]
+
+
+def tokens(text):
+  """All prefixes of all words of text"""
+  found = set()
+  for word in words(text):
+    found.update(word[:i] for i in range(1, len(word) + 1))
+  return sorted(found)
+
+
+def index_entity(user):
+  return UserSearchIndex(id=user.key.id(), tokens=tokens(user.display_name))
+
+
+def _new_generation():
+  # never reuses the generation of results cached before an eviction
+  return int(time.time() * 1000)
+
+
+def _generation():
+  generation = memcache.get(GENERATION_KEY)
+  if generation is None:
+    generation = _new_generation()
+    if not memcache.add(GENERATION_KEY, generation):
+      # lost a race, or memcache is unavailable and ours is as good as any
+      current = memcache.get(GENERATION_KEY)
+      if current is not None:
+        generation = current
+  return generation
+
+
+def invalidate():
+  """Drops all cached results"""
+  memcache.incr(GENERATION_KEY, initial_value=_new_generation())
+
+
+@ndb.tasklet
+def index_async(user, previous_name=None):
+  """(Re)indexes a user that's been put, unless tokens of its previous
+  display_name (if known) are the same. Writes of concurrent calls are
+  batched by ndb.
+  """
+  entity = index_entity(user)
+  if previous_name is not None and entity.tokens == tokens(previous_name):
+    return
+  yield (entity.put_async(),
+         ndb.get_context().memcache_incr(GENERATION_KEY,
+                                         initial_value=_new_generation()))
+
+
+def index(user):
+  index_async(user).get_result()
+
+
+@ndb.tasklet
+def unindex_async(user_key):
+  """Removes a deleted user from the index"""
+  yield (ndb.Key(UserSearchIndex, user_key.id()).delete_async(),
+         ndb.get_context().memcache_incr(GENERATION_KEY,
+                                         initial_value=_new_generation()))
+
+
+def unindex(user_key):
+  unindex_async(user_key).get_result()
+
+
+def search_ids(query, limit=DEFAULT_LIMIT, use_cache=True):
+  """Returns ids of up to limit users matching query, in key order"""
+  query_words = sorted(set(words(query)))
+  if not query_words:
+    return []
+
+  if use_cache:
+    generation = _generation()
+    digest = hashlib.md5(u' '.join(query_words).encode('utf-8')).hexdigest()
+    cache_key = 'user_search:%d:%d:%s' % (generation, limit, digest)
+    ids = memcache.get(cache_key)
+    if ids is not None:
+      return ids
+
+  filters = [UserSearchIndex.tokens == w for w in query_words]
+  keys = UserSearchIndex.query(*filters).fetch(limit, keys_only=True)
+  ids = [k.id() for k in keys]
+  if use_cache:
+    memcache.set(cache_key, ids, RESULTS_TTL)
+  return ids
+
+
+def search(query, limit=DEFAULT_LIMIT):
+  """Returns UserSummary objects of users matching query"""
+  return filter(None, summary.get_summaries(search_ids(query, limit)))
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from google.appengine.ext import ndb
+
+class Settings(ndb.Model):
+  """Runtime app settings, a single entity with GLOBAL_ID key id.
+  Don't read it directly, use conf.settings which caches it in-process.
+  """
+  GLOBAL_ID = 'global'
+
+  values  = ndb.JsonProperty(indexed=False)
+  version = ndb.IntegerProperty(default=0, indexed=False)
+  updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+  @classmethod
+  def get_global(cls):
+    return cls.get_by_id(cls.GLOBAL_ID)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Compact user summaries for lists (bylines, member lists, etc.).
+
+A UserSummaryRecord entity with the same id as its User is written
+along with a User whose display_name or avatar_url changed (see
+User._put_async), and cached in memcache. Summaries of users written with
+put_multi() are written in a batch too.
+get_summaries() returns them for many ids with a memcache get_multi,
+falling back to records and, for users put before records existed,
+to User entities which are then summarized.
+"""
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+MEMCACHE_PREFIX = 'user_summary:'
+# Summaries are kept in sync on put, this just frees memcache eventually
+MEMCACHE_TTL = 24 * 3600
+
+
+class UserSummary(object):
+  """Lightweight, read-only view of a User for templates"""
+  __slots__ = ('id', 'display_name', 'avatar_url')
+
+  def __init__(self, id, display_name, avatar_url):
+    self.id = id
+    self.display_name = display_name
+    self.avatar_url = avatar_url
+
+  @classmethod
+  def from_user(cls, user):
+    return cls(user.key.id(), user.display_name, user.avatar_url)
+
+  def to_json(self):
+    """See lib/jsonenc.py"""
+    return {'id': self.id, 'display_name': self.display_name,
+            'avatar_url': self.avatar_url}
+
+  def __eq__(self, other):
+    return isinstance(other, UserSummary) and \
+      self._values() == other._values()
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return 'UserSummary(%r, %r, %r)' % self._values()
+
+  def _values(self):
+    return self.id, self.display_name, self.avatar_url
+
+
+class UserSummaryRecord(ndb.Model):
+  """Derived from User, never write it directly. Key id is User's id."""
+  # cached in memcache by this module already
+  _use_cache = False
+  _use_memcache = False
+
+  display_name = ndb.StringProperty(indexed=False)
+  avatar_url   = ndb.StringProperty(indexed=False)
+
+  def to_summary(self):
+    return UserSummary(self.key.id(), self.display_name, self.avatar_url)
+
+
+def _record(user):
+  return UserSummaryRecord(id=user.key.id(), display_name=user.display_name,
+                           avatar_url=user.avatar_url)
+
+def _cached(summary):
+  return summary.display_name, summary.avatar_url
+
+
+@ndb.tasklet
+def save_async(user):
+  """Updates summary of a user that's been put. Writes of concurrent
+  calls are batched by ndb.
+  """
+  ctx = ndb.get_context()
+  yield (_record(user).put_async(),
+         ctx.memcache_set(MEMCACHE_PREFIX + str(user.key.id()),
+                          _cached(UserSummary.from_user(user)),
+                          time=MEMCACHE_TTL))
+
+
+def save(user):
+  save_async(user).get_result()
+
+
+@ndb.tasklet
+def delete_async(user_key):
+  """Deletes summary of a deleted user"""
+  ctx = ndb.get_context()
+  yield (ndb.Key(UserSummaryRecord, user_key.id()).delete_async(),
+         ctx.memcache_delete(MEMCACHE_PREFIX + str(user_key.id())))
+
+
+def delete(user_key):
+  delete_async(user_key).get_result()
+
+
+def get_summaries(ids):
+  """Returns a list of UserSummary (or None) for user ids, in the same order"""
+  if not ids:
+    return []
+  found = {}
+  cached = memcache.get_multi([str(i) for i in ids], key_prefix=MEMCACHE_PREFIX)
+  for user_id in ids:
+    if str(user_id) in cached:
+      found[user_id] = UserSummary(user_id, *cached[str(user_id)])
+
+  missing = [i for i in set(ids) if i not in found]
+  fetched = {}
+  if missing:
+    records = ndb.get_multi([ndb.Key(UserSummaryRecord, i) for i in missing])
+    for record in filter(None, records):
+      fetched[record.key.id()] = record.to_summary()
+
+    # users put before there were summary records
+    missing = [i for i in missing if i not in fetched]
+    if missing:
+      users = filter(None, ndb.get_multi([ndb.Key('User', i) for i in missing]))
+      ndb.put_multi([_record(u) for u in users])
+      for user in users:
+        fetched[user.key.id()] = UserSummary.from_user(user)
+
+  if fetched:
+    # add, not set: a concurrent put's fresh summary wins over ours
+    memcache.add_multi(dict((str(i), _cached(s)) for i, s in fetched.items()),
+                       MEMCACHE_TTL, key_prefix=MEMCACHE_PREFIX)
+    found.update(fetched)
+  return [found.get(i) for i in ids]
@@ -1,11 +1,174 @@
 # -*- coding: utf-8 -*-
+import time
+import hashlib
 import logging
 
 from google.appengine.ext import ndb
 from webapp2_extras.appengine.auth.models import User as Webapp2User
 
+import cache
+from conf import app_config
+from . import summary, search
+
+# Token validation results are cached for this many seconds in memcache...
+TOKEN_CACHE_TTL = 3600
+# ...and tokens not found in the datastore for this long.
+TOKEN_NEGATIVE_TTL = 300
+# Only missing tokens are also cached in-process, for up to this long.
+# Existing ones are always checked in memcache, so that a deleted token
+# (e.g. after logout) is rejected by every instance at once.
+TOKEN_LOCAL_TTL = 60
+
+_token_cache = cache.TwoLevelCache('auth_token', size=2000,
+                                   local_ttl=TOKEN_LOCAL_TTL,
+                                   keep_local=lambda ts: not ts)
+
+DEFAULT_AVATAR_URL = '/img/missing-avatar.jpg'
+GRAVATAR_URL = 'https://secure.gravatar.com/avatar/%s?d=mm'
+
 class User(Webapp2User):
   """Subclassed from webapp2's User expando model"""
   display_name = ndb.StringProperty(required=True)
   homepage     = ndb.StringProperty(indexed=False)
-  avatar_url   = ndb.StringProperty(default='/img/missing-avatar.jpg', indexed=False)
+  avatar_url   = ndb.StringProperty(default=DEFAULT_AVATAR_URL, indexed=False)
+
+  # Properties safe to expose, e.g. in JSON responses. Same as those
+  # stored in the auth session (no auth ids or password hash).
+  PUBLIC_PROPERTIES = app_config['webapp2_extras.auth']['user_attributes']
+
+  def to_json(self):
+    """Returns a dict of public properties, see lib/jsonenc.py"""
+    data = self.to_dict(include=self.PUBLIC_PROPERTIES)
+    data['id'] = self.key and self.key.id()
+    return data
+
+  # (display_name, avatar_url) as of the last load or put, see _put_async()
+  _synced = None
+
+  @classmethod
+  def _post_get_hook(cls, key, future):
+    user = future.get_result()
+    # not for in-context cache hits of an entity changed since its load
+    if user is not None and user._synced is None:
+      user._synced = user._summary_values()
+
+  def _summary_values(self):
+    return self.display_name, self.avatar_url
+
+  # Keep compact summaries and search index in sync,
+  # see models/summary.py and models/search.py
+  def _put_async(self, **ctx_options):
+    return self._put_derived_async(
+      super(User, self)._put_async(**ctx_options))
+  # put_multi() calls put_async(), so derived writes of its users are batched
+  put_async = _put_async
+
+  @ndb.tasklet
+  def _put_derived_async(self, future):
+    key = yield future
+    if ndb.in_transaction():
+      # derived entities are in other entity groups, and mustn't be
+      # written (nor cached) unless the user is
+      ndb.get_context().call_on_commit(
+        lambda: self._write_derived_async().get_result())
+    else:
+      yield self._write_derived_async()
+    raise ndb.Return(key)
+
+  @ndb.non_transactional
+  @ndb.tasklet
+  def _write_derived_async(self):
+    """Writes the summary and search index of a put user unless they
+    didn't change since the user was loaded. Users loaded before summaries
+    existed get theirs in get_summaries(), and are indexed by IndexUsersJob.
+    """
+    values = self._summary_values()
+    writes = [search.index_async(self, self._synced and self._synced[0])]
+    if values != self._synced:
+      writes.append(summary.save_async(self))
+    yield writes
+    self._synced = values
+
+  @classmethod
+  def _post_delete_hook(cls, key, future):
+    if future.get_exception() is None:
+      if ndb.in_transaction():
+        ndb.get_context().call_on_commit(
+          lambda: cls._delete_derived_async(key).get_result())
+      else:
+        cls._delete_derived_async(key).get_result()
+
+  @classmethod
+  @ndb.non_transactional
+  @ndb.tasklet
+  def _delete_derived_async(cls, key):
+    # both entities are deleted in a single batch
+    yield summary.delete_async(key), search.unindex_async(key)
+
+  def compute_avatar_url(self):
+    """Gravatar of user's email if there's one, default avatar otherwise"""
+    email = getattr(self, 'email', None)
+    if not email:
+      return DEFAULT_AVATAR_URL
+    return GRAVATAR_URL % hashlib.md5(email.strip().lower()).hexdigest()
+
+  #
+  # Tokens validation, cached in-process and in memcache so that
+  # get_user_by_session() (almost) never hits UserToken entities.
+  #
+
+  @classmethod
+  def _token_timestamp(cls, user_id, subject, token):
+    """Returns token creation timestamp or False if token doesn't exist"""
+    key = '%s:%s:%s' % (user_id, subject, token)
+    ts = _token_cache.get(key)
+    if ts is cache.MISS:
+      entity = cls.token_model.get_key(user_id, subject, token).get()
+      if entity:
+        ts = int(time.mktime(entity.created.timetuple()))
+      # add(), not set(): a concurrent delete_auth_token() wins over
+      # what we've just read
+      ts = _token_cache.add(key, ts or False,
+                            ts and TOKEN_CACHE_TTL or TOKEN_NEGATIVE_TTL)
+    return ts
+
+  @classmethod
+  def _cache_token(cls, user_id, subject, token, ts):
+    key = '%s:%s:%s' % (user_id, subject, token)
+    _token_cache.set(key, ts, ts and TOKEN_CACHE_TTL or TOKEN_NEGATIVE_TTL)
+
+  @classmethod
+  def validate_token(cls, user_id, subject, token):
+    return bool(cls._token_timestamp(user_id, subject, token))
+
+  @classmethod
+  def get_by_auth_token(cls, user_id, token):
+    """Returns a (user, timestamp) tuple or (None, None), see webapp2's User"""
+    ts = cls._token_timestamp(user_id, 'auth', token)
+    if ts:
+      user = cls.get_by_id(user_id)
+      if user:
+        return user, ts
+    return None, None
+
+  @classmethod
+  def create_auth_token(cls, user_id):
+    token = super(User, cls).create_auth_token(user_id)
+    cls._cache_token(user_id, 'auth', token, int(time.time()))
+    return token
+
+  @classmethod
+  def delete_auth_token(cls, user_id, token):
+    super(User, cls).delete_auth_token(user_id, token)
+    cls._cache_token(user_id, 'auth', token, False)
+
+  @classmethod
+  def create_signup_token(cls, user_id):
+    token = super(User, cls).create_signup_token(user_id)
+    cls._cache_token(user_id, 'signup', token, int(time.time()))
+    return token
+
+  @classmethod
+  def delete_signup_token(cls, user_id, token):
+    super(User, cls).delete_signup_token(user_id, token)
+    cls._cache_token(user_id, 'signup', token, False)
@@ -0,0 +1,59 @@
+"""Cold start budget, see tools/importprof.py"""
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+from . import test_utils
+
+import lazy
+from tools import importprof
+
+
+class LazyModuleTests(test_utils.TestBase):
+  def testLoadsOnFirstUse(self):
+    sys.modules.pop('colorsys', None)
+    mod = lazy.LazyModule('colorsys')
+    self.assertFalse('colorsys' in sys.modules)
+    self.assertEqual(mod.rgb_to_hsv(0, 0, 0), (0, 0, 0))
+    self.assertTrue(mod._load() is sys.modules['colorsys'])
+
+  def testSubmodule(self):
+    mod = lazy.LazyModule('os.path')
+    self.assertTrue(mod.join is os.path.join)
+
+
+class ColdStartTests(test_utils.TestBase):
+  """Profiles a cold start in a fresh interpreter"""
+
+  @classmethod
+  def setUpClass(cls):
+    super(ColdStartTests, cls).setUpClass()
+    out = subprocess.check_output(
+      [sys.executable, importprof.__file__.replace('.pyc', '.py'), '--json'])
+    cls.results = json.loads(out[out.index('{'):])
+
+  def testFirstRequest(self):
+    self.assertEqual(self.results['status'], 200)
+
+  def testHeavyModulesAreLazy(self):
+    self.assertEqual(self.results['loaded_by_main'], [])
+
+  # wall-clock timings depend on the machine and its load, see also
+  # make importprof FLAGS=--check
+  @unittest.skipUnless('COLD_START_BUDGET_MS' in os.environ,
+                       'COLD_START_BUDGET_MS is not set')
+  def testBudget(self):
+    budget = int(os.environ['COLD_START_BUDGET_MS'])
+    self.assertTrue(self.results['total_ms'] < budget,
+      'Cold start took %.1fms, budget is %dms. See make importprof' %
+      (self.results['total_ms'], budget))
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
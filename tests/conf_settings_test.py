@@ -0,0 +1,39 @@
+"""Tests for conf/settings.py"""
+
+import unittest
+from . import test_utils
+
+from conf import settings
+
+class SettingsTests(test_utils.TestBase):
+  def setUp(self):
+    super(SettingsTests, self).setUp()
+    self.now = 1000
+    self.cache = settings.SettingsCache({'ttl': 10}, 30, clock=lambda: self.now)
+
+  def testDefaults(self):
+    self.assertEqual(self.cache.get('ttl'), 10)
+    self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+  def testUpdate(self):
+    self.cache.update(ttl=20, flag=True)
+    self.assertEqual(self.cache.get('ttl'), 20)
+    self.assertEqual(self.cache.get('flag'), True)
+
+  def testRefreshInterval(self):
+    other = settings.SettingsCache({'ttl': 10}, 30, clock=lambda: self.now)
+    self.assertEqual(other.get('ttl'), 10)
+
+    self.cache.update(ttl=20)
+    # other instance doesn't see the change until the interval passes
+    self.assertEqual(other.get('ttl'), 10)
+    self.now += 31
+    self.assertEqual(other.get('ttl'), 20)
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
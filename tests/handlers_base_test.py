@@ -1,9 +1,29 @@
 """Tests for handlers base"""
 
+import os
+import gzip
+import time
+import shutil
+import tempfile
 import unittest
+from StringIO import StringIO
 from . import test_utils
 
+import json
+import webtest
+import webapp2
+from google.appengine.api import memcache
+
 import main
+import jsonenc
+import compress
+from conf import app_config, mime_type
+from handlers import base
+from handlers.base import BaseHandler, XSSI_PREFIX
+from models.user import User
+
+def gunzip(data):
+  return gzip.GzipFile(fileobj=StringIO(data)).read()
 
 class HandlersBaseTests(test_utils.WebTestBase):
   APP = main.app
@@ -21,6 +41,276 @@ class HandlersBaseTests(test_utils.WebTestBase):
     response = self.app.get('/')
     self.assertEqual(response.status_int, 200)
 
+  def testWarmup(self):
+    response = self.app.get('/_ah/warmup')
+    self.assertEqual(response.status_int, 200)
+
+  def testLocaleNegotiation(self):
+    response = self.app.get('/', headers={'Accept-Language': 'xx, en;q=0.5'})
+    self.assertEqual(response.status_int, 200)
+    self.assertTrue('<html lang="en">' in response.body)
+    self.assertTrue('Accept-Language' in response.headers['Vary'])
+
+
+class JsonHandler(BaseHandler):
+  def get(self):
+    data = [{'n': i} for i in range(3)]
+    self.render_json(data,
+      etag=self.request.get('etag') or bool(self.request.get('md5')),
+      stream=bool(self.request.get('stream')),
+      callback=self.request.get('callback', None),
+      xssi=bool(self.request.get('xssi')))
+
+class PaginateHandler(BaseHandler):
+  PAGER = "{% import '_pagination.html' as p %}{{ p.pager(page) }}"
+
+  def get(self):
+    page = self.paginate(User.query().order(User.display_name), page_size=2)
+    pager = self.jinja2.environment.from_string(self.PAGER).render(page=page)
+    self.render_json({'names': [u.display_name for u in page],
+                      'next_url': page.next_url, 'pager': pager})
+
+class RenderJsonTests(test_utils.WebTestBase):
+  APP = webapp2.WSGIApplication([('/json', JsonHandler)], config=app_config)
+
+  def testJson(self):
+    response = self.app.get('/json')
+    self.assertEqual(response.content_type, mime_type.JSON)
+    self.assertEqual(response.body, '[{"n":0},{"n":1},{"n":2}]')
+    self.assertEqual(self.app.get('/json?stream=1').body, response.body)
+
+  def testXssiAndJsonp(self):
+    response = self.app.get('/json?xssi=1')
+    self.assertTrue(response.body.startswith(XSSI_PREFIX))
+    response = self.app.get('/json?callback=app.cb')
+    self.assertEqual(response.content_type, mime_type.JS)
+    self.assertTrue(response.body.startswith('app.cb(['))
+    self.app.get('/json?callback=alert(1)//', status=400)
+
+  def testEtag(self):
+    response = self.app.get('/json?etag=v1')
+    self.assertEqual(response.etag, 'v1')
+    self.app.get('/json?etag=v1', headers={'If-None-Match': '"v1"'}, status=304)
+
+    etag = self.app.get('/json?md5=1').etag
+    self.app.get('/json?md5=1', headers={'If-None-Match': '"%s"' % etag}, status=304)
+
+  def testGzippedEtag(self):
+    app = webtest.TestApp(compress.GzipMiddleware(self.APP, min_size=0))
+    accept = {'Accept-Encoding': 'gzip'}
+    etag = self.app.get('/json?md5=1').headers['ETag']
+    response = app.get('/json?md5=1', headers=accept)
+    self.assertEqual(response.headers['ETag'], 'W/' + etag)
+
+    response = app.get('/json?md5=1', status=304, headers=dict(accept,
+      **{'If-None-Match': response.headers['ETag']}))
+    self.assertEqual(response.headers['ETag'], 'W/' + etag)
+
+  def testUserJson(self):
+    user = User(display_name='Tester', password='secret')
+    user.put()
+    data = json.loads(jsonenc.dumps(user))
+    self.assertEqual(data, {'id': user.key.id(), 'display_name': 'Tester',
+                            'avatar_url': user.avatar_url})
+
+
+class PaginateTests(test_utils.WebTestBase):
+  APP = webapp2.WSGIApplication([('/users', PaginateHandler)], config=app_config)
+
+  def setUp(self):
+    super(PaginateTests, self).setUp()
+    for name in ['Alice', 'Bob', 'Carol']:
+      User(display_name=name).put()
+
+  def testPages(self):
+    data = json.loads(self.app.get('/users?sort=name').body)
+    self.assertEqual(data['names'], ['Alice', 'Bob'])
+    self.assertTrue(data['next_url'].startswith('/users?'))
+    self.assertTrue('sort=name' in data['next_url'])
+    self.assertTrue('rel="next"' in data['pager'])
+    self.assertFalse('rel="first"' in data['pager'])
+
+    data = json.loads(self.app.get(data['next_url']).body)
+    self.assertEqual(data['names'], ['Carol'])
+    self.assertEqual(data['next_url'], None)
+    self.assertTrue('href="/users?sort=name" rel="first"' in data['pager'])
+
+  def testBadToken(self):
+    data = json.loads(self.app.get('/users?page=bogus').body)
+    self.assertEqual(data['names'], ['Alice', 'Bob'])
+
+
+class TemplateTestBase(test_utils.WebTestBase):
+  """Serves ROUTES with TEMPLATES (a dict of name => source) in a temp dir"""
+  ROUTES = []
+  TEMPLATES = {}
+  # overrides of 'webapp2_extras.i18n' config
+  I18N = {}
+
+  def setUp(self):
+    super(TemplateTestBase, self).setUp()
+    self.template_dir = tempfile.mkdtemp()
+    for name, source in self.TEMPLATES.items():
+      with open(os.path.join(self.template_dir, name), 'w') as f:
+        f.write(source)
+
+    config = dict(app_config)
+    config['webapp2_extras.jinja2'] = dict(app_config['webapp2_extras.jinja2'],
+                                           template_path=self.template_dir)
+    config['webapp2_extras.i18n'] = dict(app_config['webapp2_extras.i18n'],
+                                         **self.I18N)
+    self.APP = webapp2.WSGIApplication(self.ROUTES, config=config)
+
+  def tearDown(self):
+    shutil.rmtree(self.template_dir)
+    super(TemplateTestBase, self).tearDown()
+
+
+class LocaleHandler(BaseHandler):
+  def get(self):
+    self.render('locale')
+
+class LocaleTests(TemplateTestBase):
+  ROUTES = [('/', LocaleHandler)]
+  TEMPLATES = {'locale.html': '<p>{{ locale }}</p>'}
+  I18N = {'available_locales': ['en', 'it'], 'locale_cookie': 'locale'}
+
+  def testAcceptLanguage(self):
+    response = self.app.get('/', headers={'Accept-Language': 'it, en;q=0.5'})
+    self.assertEqual(response.body, '<p>it</p>')
+    self.assertEqual(response.headers['Vary'], 'Accept-Language, Cookie')
+    response = self.app.get('/', headers={'Accept-Language': 'xx'})
+    self.assertEqual(response.body, '<p>en</p>')
+
+  def testCookieWins(self):
+    response = self.app.get('/', headers={'Accept-Language': 'it',
+                                          'Cookie': 'locale=en'})
+    self.assertEqual(response.body, '<p>en</p>')
+
+
+class I18nHandler(BaseHandler):
+  def get(self):
+    if self.request.get('translate'):
+      base._T('It works')
+      self.response.write(base.i18n.get_i18n().locale)
+    else:
+      self.response.write('untranslated')
+
+class LazyI18nTests(TemplateTestBase):
+  ROUTES = [('/', I18nHandler)]
+  I18N = {'available_locales': ['en', 'it']}
+
+  def testNotUsed(self):
+    class Unavailable(object):
+      def __getattr__(self, name):
+        raise AssertionError('i18n.%s used' % name)
+    base.i18n, i18n = Unavailable(), base.i18n
+    try:
+      self.assertEqual(self.app.get('/').body, 'untranslated')
+    finally:
+      base.i18n = i18n
+
+  def testLocaleSelectedOnFirstUse(self):
+    response = self.app.get('/?translate=1', headers={'Accept-Language': 'it'})
+    self.assertEqual(response.body, 'it')
+    response = self.app.get('/?translate=1', headers={'Cookie': 'locale=en',
+                                                      'Accept-Language': 'it'})
+    self.assertEqual(response.body, 'en')
+
+
+class CachedHandler(BaseHandler):
+  def get(self):
+    self.render_cached(self.request.get('t', 'cached'), 'key', ttl=60,
+                       value=self.request.get('v'))
+
+class RenderCachedTests(TemplateTestBase):
+  ROUTES = [('/', CachedHandler)]
+  TEMPLATES = {'cached.html': '<p>{{ value }}</p>'}
+
+  def cache_key(self):
+    return 'render:%s:en:cached:key' % os.environ.get('CURRENT_VERSION_ID', '')
+
+  def testCachedHit(self):
+    self.assertEqual(self.app.get('/?v=1').body, '<p>1</p>')
+    self.assertEqual(self.app.get('/?v=2').body, '<p>1</p>')
+    self.assertEqual(self.app.get('/?v=2').content_type, mime_type.HTML)
+
+  def testStaleWhileRevalidate(self):
+    self.app.get('/?v=1')
+    value, _ = memcache.get(self.cache_key())
+    memcache.set(self.cache_key(), (value, time.time() - 1), time=60)
+    # another request holds the lease: serve the stale page
+    memcache.add(self.cache_key() + ':lease', 1)
+    self.assertEqual(self.app.get('/?v=2').body, '<p>1</p>')
+
+    memcache.delete(self.cache_key() + ':lease')
+    self.assertEqual(self.app.get('/?v=2').body, '<p>2</p>')
+    self.assertEqual(self.app.get('/?v=3').body, '<p>2</p>')
+
+  def testNotFound(self):
+    self.expectErrors()
+    self.app.get('/?t=missing', status=404)
+
+  def testGzippedCopy(self):
+    accept = {'Accept-Encoding': 'gzip'}
+    response = self.app.get('/?v=1', headers=accept)
+    self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+    self.assertTrue('Accept-Encoding' in response.headers['Vary'])
+    self.assertEqual(gunzip(response.body), '<p>1</p>')
+    # both versions are cached
+    (body, gzipped), _ = memcache.get(self.cache_key())
+    self.assertEqual((body, gzipped), ('<p>1</p>', response.body))
+
+    response = self.app.get('/?v=2')
+    self.assertFalse('Content-Encoding' in response.headers)
+    self.assertTrue('Accept-Encoding' in response.headers['Vary'])
+    self.assertEqual(response.body, '<p>1</p>')
+
+  def testNotCompressedTwice(self):
+    app = webtest.TestApp(compress.GzipMiddleware(self.APP, min_size=0))
+    response = app.get('/?v=1', headers={'Accept-Encoding': 'gzip'})
+    self.assertEqual(response.headers.getall('Content-Encoding'), ['gzip'])
+    self.assertEqual(gunzip(response.body), '<p>1</p>')
+
+
+class PreloadHandler(BaseHandler):
+  def get(self):
+    self.render(self.request.get('t', 'page'))
+
+class PreloadTests(TemplateTestBase):
+  ROUTES = [('/', PreloadHandler)]
+  TEMPLATES = {'page.html': '<p>page</p>', 'plain.html': '<p>plain</p>'}
+
+  def setUp(self):
+    super(PreloadTests, self).setUp()
+    with open(os.path.join(self.template_dir, base.PRELOAD_MAP), 'w') as f:
+      json.dump({'page.html': [{'url': '/css/c-1.css', 'as': 'style'},
+                               {'url': '/js/c-2.js', 'as': 'script'}]}, f)
+    base._preload_headers = None
+
+  def tearDown(self):
+    base._preload_headers = None
+    super(PreloadTests, self).tearDown()
+
+  def testLinkHeader(self):
+    response = self.app.get('/')
+    self.assertEqual(response.headers['Link'],
+      '</css/c-1.css>; rel=preload; as=style, </js/c-2.js>; rel=preload; as=script')
+
+  def testNoAssets(self):
+    self.assertFalse('Link' in self.app.get('/?t=plain').headers)
+    self.expectErrors()
+    self.assertFalse('Link' in self.app.get('/?t=missing', status=404).headers)
+
+  def testBadMap(self):
+    self.expectWarnings()
+    for content in ['{"page.html": [', '{"page.html": [{"url": "/c.css"}]}',
+                    '["page.html"]']:
+      with open(os.path.join(self.template_dir, base.PRELOAD_MAP), 'w') as f:
+        f.write(content)
+      base._preload_headers = None
+      self.assertFalse('Link' in self.app.get('/').headers)
+      self.assertEqual(base._preload_headers, {})
 
 
 def main():
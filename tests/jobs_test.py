@@ -0,0 +1,124 @@
+"""Tests for background jobs framework and handlers"""
+
+import unittest
+from . import test_utils
+
+from google.appengine.ext import ndb, testbed
+
+import main
+import jobs
+from jobs.avatars import RecomputeAvatarsJob
+from models.job import JobCheckpoint
+from models.user import User, DEFAULT_AVATAR_URL
+
+
+class JobsTests(test_utils.WebTestBase):
+  APP = main.app
+
+  def setUp(self):
+    super(JobsTests, self).setUp()
+    self.taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+    users = [User(display_name='User %d' % i) for i in range(25)]
+    users[0].email = 'Someone@Example.org'
+    users[1].avatar_url = 'http://example.org/me.png'
+    self.keys = ndb.put_multi(users)
+
+  def newJob(self):
+    job = RecomputeAvatarsJob('recompute_avatars')
+    job.batch_size = 5
+    job.batches_per_task = 2
+    return job
+
+  def runTasks(self, retries=0):
+    """Runs queued tasks until there are none left, returns their number"""
+    count = 0
+    while True:
+      tasks = self.taskqueue.get_filtered_tasks()
+      if not tasks:
+        return count
+      self.taskqueue.FlushQueue('default')
+      for task in tasks:
+        headers = {'X-AppEngine-TaskRetryCount': str(retries)}
+        self.app.post(task.url, task.payload, headers=headers)
+        count += 1
+
+  def testRegistry(self):
+    job = jobs.get('recompute_avatars')
+    self.assertTrue(isinstance(job, RecomputeAvatarsJob))
+    self.assertEqual(job.name, 'recompute_avatars')
+    self.assertEqual(jobs.get('no_such_job'), None)
+
+  def testRunThroughHandlers(self):
+    resp = self.app.get('/cron/jobs/recompute_avatars?run_id=r1')
+    self.assertEqual(resp.body, 'r1')
+    self.assertEqual(self.runTasks(), 1)
+
+    users = ndb.get_multi(self.keys)
+    self.assertTrue(users[0].avatar_url.endswith(
+      '/avatar/a70eaed09677478b42b11fc7a04f4c87?d=mm'))
+    self.assertEqual(users[1].avatar_url, 'http://example.org/me.png')
+    self.assertEqual(users[2].avatar_url, DEFAULT_AVATAR_URL)
+
+    cp = JobCheckpoint.make_key('recompute_avatars', 'r1', 0).get()
+    self.assertTrue(cp.done)
+    self.assertEqual(cp.processed, 25)
+
+  def testUnknownJob(self):
+    self.app.get('/cron/jobs/no_such_job', status=404)
+
+  def testSlicesAreChained(self):
+    job = self.newJob()
+    job.start('r1')
+    self.assertTrue(job.run_slice('r1', 0, 0))
+    tasks = self.taskqueue.get_filtered_tasks(url='/tasks/jobs/recompute_avatars')
+    self.assertEqual(len(tasks), 2)
+    cp = JobCheckpoint.make_key(job.name, 'r1', 0).get()
+    self.assertEqual((cp.slice, cp.processed, cp.done), (1, 10, False))
+
+  def testShardRunsToCompletion(self):
+    job = self.newJob()
+    job.start('r1')
+    for slice_no in range(3):
+      self.assertTrue(job.run_slice('r1', 0, slice_no))
+    self.assertFalse(job.run_slice('r1', 0, 3))
+    cp = JobCheckpoint.make_key(job.name, 'r1', 0).get()
+    self.assertEqual((cp.slice, cp.processed, cp.done), (3, 25, True))
+
+  def testCompletedOnce(self):
+    job = self.newJob()
+    job.shards = 2
+    completed = []
+    job.completed = completed.append
+    job.start('r1')
+    shards = [cp.shard for cp in job.status('r1')]
+    self.assertEqual(len(shards), 2)
+    for shard in shards:
+      slice_no = 0
+      while job.run_slice('r1', shard, slice_no):
+        slice_no += 1
+    self.assertEqual(completed, ['r1'])
+
+  def testDuplicateSliceIsSkipped(self):
+    job = self.newJob()
+    job.start('r1')
+    self.assertTrue(job.run_slice('r1', 0, 0))
+    self.assertFalse(job.run_slice('r1', 0, 0))
+    cp = JobCheckpoint.make_key(job.name, 'r1', 0).get()
+    self.assertEqual((cp.slice, cp.processed), (1, 10))
+
+  def testRetriesExhausted(self):
+    self.expectErrors()
+    self.app.get('/cron/jobs/recompute_avatars?run_id=r1')
+    self.runTasks(retries=RecomputeAvatarsJob.max_retries)
+    cp = JobCheckpoint.make_key('recompute_avatars', 'r1', 0).get()
+    self.assertTrue(cp.failed)
+    self.assertEqual(cp.processed, 0)
+    self.assertEqual(ndb.get_multi(self.keys)[0].avatar_url, DEFAULT_AVATAR_URL)
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
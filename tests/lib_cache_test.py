@@ -0,0 +1,94 @@
+"""Tests for lib/cache.py and lib/fragment_cache.py"""
+
+import unittest
+import test_utils
+
+import jinja2
+from google.appengine.api import memcache
+
+import cache
+import fragment_cache
+
+class LRUCacheTests(unittest.TestCase):
+  def setUp(self):
+    self.now = 1000
+    self.lru = cache.LRUCache(2, clock=lambda: self.now)
+
+  def testEviction(self):
+    self.lru.set('a', 1)
+    self.lru.set('b', 2)
+    self.lru.get('a')
+    self.lru.set('c', 3)
+    self.assertEqual(self.lru.get('a'), 1)
+    self.assertTrue(self.lru.get('b') is cache.MISS)
+    self.assertEqual(self.lru.get('c'), 3)
+
+  def testTTL(self):
+    self.lru.set('a', None, ttl=10)
+    self.assertEqual(self.lru.get('a'), None)
+    self.now += 11
+    self.assertTrue(self.lru.get('a') is cache.MISS)
+
+
+class TwoLevelCacheTests(test_utils.TestBase):
+  def testGetSet(self):
+    c = cache.TwoLevelCache('test')
+    self.assertTrue(c.get('a') is cache.MISS)
+    c.set('a', False, 60)
+    self.assertEqual(c.get('a'), False)
+
+    # another instance finds it in memcache
+    other = cache.TwoLevelCache('test')
+    self.assertEqual(other.get('a'), False)
+    self.assertEqual(other.stats()['memcache_hits'], 1)
+    self.assertEqual(other.get('a'), False)
+    self.assertEqual(other.stats()['hits'], 1)
+
+    c.delete('a')
+    self.assertTrue(c.get('a') is cache.MISS)
+    self.assertEqual(memcache.get('test:a'), None)
+
+  def testAdd(self):
+    c = cache.TwoLevelCache('test')
+    self.assertEqual(c.add('a', 1, 60), 1)
+    other = cache.TwoLevelCache('test')
+    self.assertEqual(other.add('a', 2, 60), 1)
+    self.assertEqual(other.get('a'), 1)
+
+  def testKeepLocal(self):
+    c = cache.TwoLevelCache('test', keep_local=lambda v: not v)
+    c.set('yes', True, 60)
+    c.set('no', False, 60)
+    self.assertTrue(c.lru.get('yes') is cache.MISS)
+    self.assertEqual(c.lru.get('no'), False)
+
+    memcache.delete('test:yes')
+    self.assertTrue(c.get('yes') is cache.MISS)
+
+
+class FragmentCacheTests(test_utils.TestBase):
+  TEMPLATE = ('{% cache "frag", 60 %}<b>{{ value }}</b>{% endcache %}'
+              '|{{ value }}')
+
+  def setUp(self):
+    super(FragmentCacheTests, self).setUp()
+    fragment_cache.fragments.lru.clear()
+    env = jinja2.Environment(autoescape=True,
+      extensions=['fragment_cache.FragmentCacheExtension'])
+    self.template = env.from_string(self.TEMPLATE)
+
+  def testCachedFragment(self):
+    self.assertEqual(self.template.render(value=1, locale='en'), '<b>1</b>|1')
+    self.assertEqual(self.template.render(value=2, locale='en'), '<b>1</b>|2')
+
+  def testLocaleNamespace(self):
+    self.assertEqual(self.template.render(value=1, locale='en'), '<b>1</b>|1')
+    self.assertEqual(self.template.render(value=2, locale='it'), '<b>2</b>|2')
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
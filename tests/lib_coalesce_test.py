@@ -0,0 +1,65 @@
+"""Tests for lib/coalesce.py"""
+
+import time
+import threading
+import unittest
+import test_utils
+
+from google.appengine.api import memcache
+
+import coalesce
+
+class CoalescerTests(unittest.TestCase):
+  def testSingleComputation(self):
+    coalescer = coalesce.Coalescer()
+    calls = []
+    results = []
+
+    def compute():
+      calls.append(1)
+      time.sleep(0.1)
+      return 42
+
+    threads = [threading.Thread(
+      target=lambda: results.append(coalescer.do('key', compute)))
+      for _ in range(5)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+
+    self.assertEqual(len(calls), 1)
+    self.assertEqual(results, [42] * 5)
+
+  def testException(self):
+    coalescer = coalesce.Coalescer()
+    def fail():
+      raise ValueError('oops')
+    self.assertRaises(ValueError, coalescer.do, 'key', fail)
+    # failures are not cached
+    self.assertEqual(coalescer.do('key', lambda: 1), 1)
+
+
+class CachedTests(test_utils.TestBase):
+  def testCached(self):
+    self.assertEqual(coalesce.cached('key', lambda: 1, 60), 1)
+    self.assertEqual(coalesce.cached('key', lambda: 2, 60), 1)
+
+  def testStaleWhileRevalidate(self):
+    memcache.set('key', ('stale', time.time() - 1), time=60)
+    # another instance holds the lease: serve the stale value
+    memcache.add('key:lease', 1)
+    self.assertEqual(coalesce.cached('key', lambda: 'fresh', 60), 'stale')
+
+    # lease released: recompute
+    memcache.delete('key:lease')
+    self.assertEqual(coalesce.cached('key', lambda: 'fresh', 60), 'fresh')
+    self.assertEqual(coalesce.cached('key', lambda: 'newer', 60), 'fresh')
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
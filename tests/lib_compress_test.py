@@ -0,0 +1,91 @@
+"""Tests for lib/compress.py"""
+
+import gzip
+import unittest
+import test_utils
+from StringIO import StringIO
+
+import webtest
+
+import compress
+
+def text_app(body, content_type='text/html', headers=()):
+  def app(environ, start_response):
+    start_response('200 OK', [('Content-Type', content_type)] + list(headers))
+    # yield it in a few chunks
+    return [body[i:i + 100] for i in range(0, len(body), 100)]
+  return app
+
+def gunzip(data):
+  return gzip.GzipFile(fileobj=StringIO(data)).read()
+
+class GzipMiddlewareTests(unittest.TestCase):
+  BIG = 'Lorem ipsum dolor sit amet. ' * 100
+  ACCEPT = {'Accept-Encoding': 'gzip, deflate'}
+
+  def get(self, app, headers=ACCEPT):
+    return webtest.TestApp(compress.GzipMiddleware(app)).get('/', headers=headers)
+
+  def testCompress(self):
+    response = self.get(text_app(self.BIG))
+    self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+    self.assertTrue(len(response.body) < len(self.BIG))
+    self.assertEqual(gunzip(response.body), self.BIG)
+
+  def testNotAccepted(self):
+    response = self.get(text_app(self.BIG), headers={})
+    self.assertFalse('Content-Encoding' in response.headers)
+    response = self.get(text_app(self.BIG), {'Accept-Encoding': 'gzip;q=0'})
+    self.assertFalse('Content-Encoding' in response.headers)
+
+  def testSkipped(self):
+    # too small
+    response = self.get(text_app('small'))
+    self.assertEqual(response.body, 'small')
+    # not text
+    response = self.get(text_app(self.BIG, 'image/png'))
+    self.assertEqual(response.body, self.BIG)
+
+  def testAlreadyEncoded(self):
+    gzipped = compress.gzip_string(self.BIG)
+    response = self.get(text_app(gzipped, headers=[('Content-Encoding', 'gzip'),
+                                                   ('Vary', 'Accept-Encoding'),
+                                                   ('ETag', '"v1"')]))
+    self.assertEqual(response.body, gzipped)
+    self.assertEqual(response.headers.getall('Content-Encoding'), ['gzip'])
+    self.assertEqual(response.headers.getall('Vary'), ['Accept-Encoding'])
+    self.assertEqual(response.headers['ETag'], '"v1"')
+
+  def testVary(self):
+    app = text_app(self.BIG, headers=[('Vary', 'Accept-Language, Cookie')])
+    for headers in [self.ACCEPT, {}]:
+      response = self.get(app, headers)
+      self.assertEqual(response.headers.getall('Vary'),
+                       ['Accept-Language, Cookie, Accept-Encoding'])
+    self.assertEqual(self.get(text_app('small'), {}).headers['Vary'],
+                     'Accept-Encoding')
+    self.assertFalse('Vary' in self.get(text_app(self.BIG, 'image/png')).headers)
+
+  def testWeakEtag(self):
+    app = text_app(self.BIG, headers=[('ETag', '"v1"')])
+    self.assertEqual(self.get(app).headers['ETag'], 'W/"v1"')
+    self.assertEqual(self.get(app, headers={}).headers['ETag'], '"v1"')
+    app = text_app(self.BIG, headers=[('ETag', 'W/"v1"')])
+    self.assertEqual(self.get(app).headers['ETag'], 'W/"v1"')
+
+  def testNotModified(self):
+    def app(environ, start_response):
+      start_response('304 Not Modified', [('ETag', '"v1"')])
+      return []
+    headers = dict(self.ACCEPT, **{'If-None-Match': 'W/"v1"'})
+    response = webtest.TestApp(compress.GzipMiddleware(app)).get(
+      '/', headers=headers, status=304)
+    self.assertEqual(response.headers['ETag'], 'W/"v1"')
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
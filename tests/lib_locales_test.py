@@ -0,0 +1,59 @@
+"""Tests for lib/locales.py"""
+
+import unittest
+import test_utils
+
+from webob import Request
+
+import locales
+
+class NegotiateTests(unittest.TestCase):
+  AVAILABLE = ['en', 'it', 'pt_BR']
+
+  def negotiate(self, headers=None, cookie=None):
+    req = Request.blank('/', headers=headers or {})
+    if cookie:
+      req.headers['Cookie'] = 'locale=%s' % cookie
+    return locales.negotiate(req, self.AVAILABLE, 'en', 'locale')
+
+  def testDefault(self):
+    self.assertEqual(self.negotiate(), 'en')
+    self.assertEqual(self.negotiate({'Accept-Language': 'de'}), 'en')
+
+  def testAcceptLanguage(self):
+    self.assertEqual(self.negotiate({'Accept-Language': 'it-IT,en;q=0.5'}), 'it')
+    self.assertEqual(self.negotiate({'Accept-Language': 'de,en;q=0.5'}), 'en')
+
+  def testCookieWins(self):
+    self.assertEqual(self.negotiate({'Accept-Language': 'it'}, cookie='pt_BR'), 'pt_BR')
+    # unknown locale in a cookie is ignored
+    self.assertEqual(self.negotiate({'Accept-Language': 'it'}, cookie='xx'), 'it')
+
+
+class _FakeStore(object):
+  def __init__(self):
+    self.loaded = []
+
+  def get_translations(self, locale):
+    import gettext
+    self.loaded.append(locale)
+    return gettext.NullTranslations()
+
+class CatalogsTests(unittest.TestCase):
+  def testLoadedOnce(self):
+    store = _FakeStore()
+    catalogs = locales.Catalogs()
+    catalogs.preload(store, ['en', 'it'])
+    en = catalogs.get(store, 'en')
+    self.assertTrue(en is catalogs.get(store, 'en'))
+    self.assertEqual(store.loaded, ['en', 'it'])
+    self.assertEqual(en.gettext('Hello'), 'Hello')
+    self.assertTrue(en.template_globals() is en.template_globals())
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,100 @@
+"""Tests for lib/paginate.py"""
+
+import unittest
+from . import test_utils
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+import paginate
+
+
+class Item(ndb.Model):
+  n = ndb.IntegerProperty()
+
+
+class Other(ndb.Model):
+  n = ndb.IntegerProperty()
+
+
+class PaginateTests(test_utils.TestBase):
+  def setUp(self):
+    super(PaginateTests, self).setUp()
+    self.keys = ndb.put_multi([Item(n=i) for i in range(25)])
+    self.query = Item.query().order(Item.n)
+
+  def numbers(self, page):
+    return [item.n for item in page]
+
+  def testPages(self):
+    page = paginate.paginate(self.query, page_size=10)
+    self.assertTrue(page.is_first)
+    self.assertEqual(self.numbers(page), range(10))
+    page = paginate.paginate(self.query, page.next_token, page_size=10)
+    self.assertEqual(self.numbers(page), range(10, 20))
+    page = paginate.paginate(self.query, page.next_token, page_size=10)
+    self.assertEqual(self.numbers(page), range(20, 25))
+    self.assertFalse(page.has_next)
+
+  def testExactMultiple(self):
+    page = paginate.paginate(self.query, page_size=25)
+    self.assertEqual(len(page), 25)
+    self.assertFalse(page.has_next)
+
+  def testEmpty(self):
+    page = paginate.paginate(Item.query(Item.n < 0), page_size=10)
+    self.assertEqual(len(page), 0)
+    self.assertFalse(page.has_next)
+
+  def testWindowIsCached(self):
+    first = paginate.paginate(self.query, page_size=5, window=3)
+    second = paginate.paginate(self.query, first.next_token, page_size=5)
+    third = paginate.paginate(self.query, second.next_token, page_size=5)
+
+    # new entities don't show up in cached pages...
+    Item(n=-1).put()
+    self.assertEqual(self.numbers(paginate.paginate(self.query, page_size=5)),
+                     range(5))
+    self.assertEqual(
+      self.numbers(paginate.paginate(self.query, third.token, page_size=5)),
+      range(10, 15))
+    # ...but the page after the window is queried
+    fourth = paginate.paginate(self.query, third.next_token, page_size=5)
+    self.assertEqual(self.numbers(fourth), range(15, 20))
+
+    memcache.flush_all()
+    self.assertEqual(self.numbers(paginate.paginate(self.query, page_size=5)),
+                     [-1] + range(4))
+
+  def testDeletedEntitiesAreSkipped(self):
+    paginate.paginate(self.query, page_size=10)
+    self.keys[3].delete()
+    page = paginate.paginate(self.query, page_size=10)
+    self.assertEqual(self.numbers(page), [0, 1, 2] + range(4, 10))
+
+  def testBadTokens(self):
+    page = paginate.paginate(self.query, page_size=10)
+    other = Item.query().order(-Item.n)
+    self.assertRaises(paginate.BadToken,
+                      paginate.paginate, other, page.next_token, page_size=10)
+    self.assertRaises(paginate.BadToken,
+                      paginate.paginate, self.query, page.next_token, page_size=5)
+    self.assertRaises(paginate.BadToken,
+                      paginate.paginate, self.query, 'bogus', page_size=10)
+
+  def testBogusCursor(self):
+    # well-formed, but a cursor of another query
+    ndb.put_multi([Other(n=i) for i in range(3)])
+    _, cursor, _ = Other.query().order(-Other.n).fetch_page(2)
+    token = paginate.encode_token(paginate.fingerprint(self.query, 10), cursor)
+    self.assertRaises(paginate.BadToken,
+                      paginate.paginate, self.query, token, page_size=10)
+
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,66 @@
+"""Tests for lib/sessions_hybrid.py"""
+
+import unittest
+import test_utils
+
+import webapp2
+from webapp2_extras import sessions
+from webapp2_extras.appengine import sessions_ndb
+
+from conf import app_config
+
+class HybridSessionTests(test_utils.TestBase):
+  def setUp(self):
+    super(HybridSessionTests, self).setUp()
+    self.app = webapp2.WSGIApplication(config=app_config)
+    self.cookie = None
+
+  def request(self, delete=(), **values):
+    """Updates the session and returns (session, Set-Cookie value)"""
+    request = webapp2.Request.blank('/')
+    request.app = self.app
+    if self.cookie:
+      request.headers['Cookie'] = self.cookie
+    store = sessions.SessionStore(request)
+    session = store.get_session(backend='hybrid')
+    session.update(values)
+    for name in delete:
+      del session[name]
+
+    response = webapp2.Response()
+    store.save_sessions(response)
+    set_cookie = response.headers.get('Set-Cookie')
+    if set_cookie:
+      self.cookie = set_cookie.split(';')[0]
+    return session, set_cookie
+
+  def testSmallSessionInCookie(self):
+    _, cookie = self.request(foo='bar')
+    session, _ = self.request()
+    self.assertEqual(session['foo'], 'bar')
+    self.assertFalse('_sid' in session)
+
+  def testLargeSessionSpills(self):
+    big = 'x' * 4096
+    _, cookie = self.request(big=big)
+    self.assertTrue(len(cookie) < 512)
+
+    session, _ = self.request()
+    self.assertEqual(session['big'], big)
+    self.assertFalse('_sid' in session)
+
+  def testShrinkBackToCookie(self):
+    self.request(big='x' * 4096)
+    self.assertEqual(sessions_ndb.Session.query().count(), 1)
+    self.request(delete=['big'], small=1)
+    self.assertEqual(sessions_ndb.Session.query().count(), 0)
+    session, _ = self.request()
+    self.assertEqual(dict(session), {'small': 1})
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
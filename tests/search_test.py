@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Tests for users prefix search"""
+
+import unittest
+from . import test_utils
+
+from google.appengine.ext import ndb
+
+from models import search
+from models.search import UserSearchIndex
+from models.user import User
+from jobs.search_index import IndexUsersJob
+
+
+class UserSearchTests(test_utils.TestBase):
+  def setUp(self):
+    super(UserSearchTests, self).setUp()
+    self.users = [User(display_name=name) for name in
+                  [u'Alice Smith', u'Alicia Keys', u'Bob Smithers', u'José Álvarez']]
+    ndb.put_multi(self.users)
+    self.ids = [u.key.id() for u in self.users]
+
+  def names(self, query, **kwargs):
+    return sorted(s.display_name for s in search.search(query, **kwargs))
+
+  def testTokens(self):
+    self.assertEqual(search.words(u'  José-ÁLVAREZ! '), [u'jose', u'alvarez'])
+    self.assertEqual(search.tokens('Bob B'), [u'b', u'bo', u'bob'])
+    self.assertEqual(len(search.tokens('x' * 50)), search.MAX_PREFIX_LEN)
+
+  def testPrefixSearch(self):
+    self.assertEqual(self.names('ali'), [u'Alice Smith', u'Alicia Keys'])
+    self.assertEqual(self.names('smi'), [u'Alice Smith', u'Bob Smithers'])
+    self.assertEqual(self.names('SMITH al'), [u'Alice Smith'])
+    self.assertEqual(self.names(u'alv'), [u'José Álvarez'])
+    self.assertEqual(self.names('nobody'), [])
+    self.assertEqual(self.names(' - '), [])
+
+  def testLimit(self):
+    self.assertEqual(len(search.search_ids('a', limit=2)), 2)
+
+  def testReindexedOnPut(self):
+    self.assertEqual(search.search_ids('bob'), [self.ids[2]])
+    self.users[2].display_name = 'Robert Smithers'
+    self.users[2].put()
+    self.assertEqual(search.search_ids('bob'), [])
+    self.assertEqual(search.search_ids('rob'), [self.ids[2]])
+
+  def testUnindexedOnDelete(self):
+    self.assertEqual(search.search_ids('keys'), [self.ids[1]])
+    self.users[1].key.delete()
+    self.assertEqual(search.search_ids('keys'), [])
+    self.assertEqual(UserSearchIndex.get_by_id(self.ids[1]), None)
+
+  def testUnindexedOnDeleteInTransaction(self):
+    self.assertEqual(search.search_ids('keys'), [self.ids[1]])
+    ndb.transaction(self.users[1].key.delete)
+    self.assertEqual(search.search_ids('keys'), [])
+    self.assertEqual(UserSearchIndex.get_by_id(self.ids[1]), None)
+
+  def testNotReindexedWhenUnchanged(self):
+    self.assertEqual(search.search_ids('alice'), [self.ids[0]])
+    generation = search._generation()
+    self.users[0].put()
+    self.users[0].display_name = u'ALICE smith'
+    self.users[0].avatar_url = '/a.png'
+    self.users[0].put()
+    self.assertEqual(search._generation(), generation)
+
+    self.users[0].display_name = u'Alice Smithson'
+    self.users[0].put()
+    self.assertNotEqual(search._generation(), generation)
+    self.assertEqual(search.search_ids('smithson'), [self.ids[0]])
+
+  def testMemcacheUnavailable(self):
+    class Unavailable(object):
+      def get(self, key):
+        return None
+      def add(self, key, value):
+        return False
+      def set(self, key, value, time=0):
+        return False
+    search.memcache, memcache = Unavailable(), search.memcache
+    try:
+      self.assertEqual(self.names('ali'), [u'Alice Smith', u'Alicia Keys'])
+    finally:
+      search.memcache = memcache
+
+  def testResultsCached(self):
+    self.assertEqual(search.search_ids('alice'), [self.ids[0]])
+    # index changes behind search's back aren't noticed...
+    ndb.Key(UserSearchIndex, self.ids[0]).delete()
+    self.assertEqual(search.search_ids('alice'), [self.ids[0]])
+    self.assertEqual(search.search_ids('alice', use_cache=False), [])
+    # ...until the cache is invalidated
+    search.invalidate()
+    self.assertEqual(search.search_ids('alice'), [])
+
+  def testIndexUsersJob(self):
+    ndb.delete_multi([ndb.Key(UserSearchIndex, i) for i in self.ids])
+    search.invalidate()
+    job = IndexUsersJob('index_users')
+    job.batch_size = 1
+    job.batches_per_task = 3
+    job.start('r1')
+    self.assertEqual(self.names('smi'), [])
+    # cached results are dropped once, when the whole index is rebuilt
+    generation = search._generation()
+    self.assertTrue(job.run_slice('r1', 0, 0))
+    self.assertEqual(search._generation(), generation)
+    self.assertTrue(job.run_slice('r1', 0, 1))
+    self.assertNotEqual(search._generation(), generation)
+    self.assertEqual(self.names('smi'), [u'Alice Smith', u'Bob Smithers'])
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
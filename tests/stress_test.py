@@ -0,0 +1,40 @@
+"""Smoke test of the concurrency stress harness (benchmarks/stress.py)"""
+
+import unittest
+from . import test_utils
+
+import webapp2
+
+import main
+from benchmarks import stress
+
+
+class StressTests(test_utils.WebTestBase):
+  def testNoLeaksBetweenConcurrentRequests(self):
+    harness = stress.StressHarness()
+    for stats in harness.stress([1, 4], 3):
+      self.assertEqual(stats['errors'], [])
+      self.assertEqual(stats['leaks'], [])
+      self.assertEqual(stats['requests'], stats['threads'] * 3 * 2)
+
+  def testMainAppUntouched(self):
+    routes = list(main.webapp.router.match_routes)
+    stress.probe_app()
+    self.assertEqual(main.webapp.router.match_routes, routes)
+    self.assertTrue(webapp2.get_app() is main.webapp)
+
+  def testEncodeMultipart(self):
+    content_type, body = stress.encode_multipart(
+      {'token': 'abc'}, {'upload': ('up.txt', 'data')})
+    boundary = content_type.split('boundary=')[1]
+    self.assertTrue(body.startswith('--' + boundary))
+    self.assertTrue('filename="up.txt"' in body)
+    self.assertTrue(body.endswith('--' + boundary + '--\r\n'))
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,126 @@
+"""Tests for user summaries"""
+
+import json
+import unittest
+from . import test_utils
+
+from google.appengine.api import apiproxy_stub_map, memcache
+from google.appengine.ext import ndb
+
+import jsonenc
+from models import search, summary
+from models.summary import UserSummary, UserSummaryRecord, get_summaries
+from models.user import User
+
+
+def put_rpcs(func):
+  """Runs func, returns kinds of entities of every datastore Put call"""
+  puts = []
+  def hook(service, call, request, response):
+    if call == 'Put':
+      puts.append(sorted(set(e.key().path().element_list()[-1].type()
+                             for e in request.entity_list())))
+  hooks = apiproxy_stub_map.apiproxy.GetPreCallHooks()
+  hooks.Append('put_rpcs', hook, 'datastore_v3')
+  try:
+    func()
+  finally:
+    hooks.Clear()
+  return puts
+
+
+class UserSummaryTests(test_utils.TestBase):
+  def setUp(self):
+    super(UserSummaryTests, self).setUp()
+    self.alice = User(display_name='Alice', avatar_url='/a.png')
+    self.bob = User(display_name='Bob')
+    ndb.put_multi([self.alice, self.bob])
+
+  def testSyncedOnPut(self):
+    record = UserSummaryRecord.get_by_id(self.alice.key.id())
+    self.assertEqual(record.to_summary(),
+                     UserSummary(self.alice.key.id(), 'Alice', '/a.png'))
+
+    self.alice.display_name = 'Alice B.'
+    self.alice.put()
+    self.assertEqual(get_summaries([self.alice.key.id()])[0].display_name,
+                     'Alice B.')
+
+  def testSkippedWhenUnchanged(self):
+    user_id = self.alice.key.id()
+    ndb.Key(UserSummaryRecord, user_id).delete()
+    self.alice.put()
+    ndb.get_context().clear_cache()
+    User.get_by_id(user_id).put()
+    self.assertEqual(UserSummaryRecord.get_by_id(user_id), None)
+
+    user = User.get_by_id(user_id)
+    user.avatar_url = '/b.png'
+    user.put()
+    self.assertEqual(UserSummaryRecord.get_by_id(user_id).avatar_url, '/b.png')
+
+  def testBatchedWrites(self):
+    users = [User(display_name='User %d' % i) for i in range(5)]
+    puts = put_rpcs(lambda: ndb.put_multi(users))
+    self.assertEqual(puts, [['User'], ['UserSearchIndex', 'UserSummaryRecord']])
+    self.assertEqual([s.display_name for s in
+                      get_summaries([u.key.id() for u in users])],
+                     ['User %d' % i for i in range(5)])
+
+  def testPutInTransaction(self):
+    # derived entities are written once the user is committed, outside
+    # of its entity group
+    carol = User(display_name='Carol')
+    ndb.transaction(carol.put)
+    self.assertEqual(get_summaries([carol.key.id()])[0].display_name, 'Carol')
+    self.assertEqual(search.search_ids('carol'), [carol.key.id()])
+
+    def rename():
+      carol.display_name = 'Caroline'
+      carol.put()
+      raise ndb.Rollback()
+    ndb.transaction(rename)
+    self.assertEqual(UserSummaryRecord.get_by_id(carol.key.id()).display_name,
+                     'Carol')
+    self.assertEqual(search.search_ids('caroline'), [])
+
+  def testDeletedWithUser(self):
+    self.bob.key.delete()
+    self.assertEqual(UserSummaryRecord.get_by_id(self.bob.key.id()), None)
+    self.assertEqual(get_summaries([self.bob.key.id()]), [None])
+
+  def testGetSummaries(self):
+    ids = [self.bob.key.id(), 12345, self.alice.key.id()]
+    summaries = get_summaries(ids)
+    self.assertEqual([s and s.display_name for s in summaries],
+                     ['Bob', None, 'Alice'])
+    self.assertFalse(hasattr(summaries[0], '__dict__'))
+
+  def testServedFromMemcache(self):
+    ids = [self.alice.key.id(), self.bob.key.id()]
+    memcache.flush_all()
+    get_summaries(ids)
+    ndb.delete_multi([ndb.Key(UserSummaryRecord, i) for i in ids])
+    self.assertEqual([s.display_name for s in get_summaries(ids)],
+                     ['Alice', 'Bob'])
+
+  def testBackfilledFromUsers(self):
+    user_id = self.alice.key.id()
+    ndb.Key(UserSummaryRecord, user_id).delete()
+    memcache.delete(str(user_id), key_prefix=summary.MEMCACHE_PREFIX)
+
+    self.assertEqual(get_summaries([user_id])[0].avatar_url, '/a.png')
+    self.assertTrue(UserSummaryRecord.get_by_id(user_id))
+
+  def testToJson(self):
+    s = UserSummary(1, 'Alice', '/a.png')
+    self.assertEqual(json.loads(jsonenc.dumps(s)),
+      {'id': 1, 'display_name': 'Alice', 'avatar_url': '/a.png'})
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -17,14 +17,41 @@ class TestBase(unittest.TestCase):
 
   APP_ID = '_'
 
+  # Set to True in a subclass to activate the testbed once per class
+  # instead of once per test. Stubs are then only cleared between tests
+  # (see _reset_stubs()), so use it only when tests don't depend on
+  # anything else than an empty datastore, memcache and task queues.
+  REUSE_STUBS = False
+  _shared_testbed = None
+
+  @classmethod
+  def setUpClass(cls):
+    if cls.REUSE_STUBS:
+      cls._shared_testbed = cls._init_testbed()
+
+  @classmethod
+  def tearDownClass(cls):
+    if cls._shared_testbed:
+      cls._shared_testbed.deactivate()
+      cls._shared_testbed = None
+
+  @classmethod
+  def _init_testbed(cls):
+    tb = testbed.Testbed()
+    tb.setup_env(app_id=cls.APP_ID)
+    tb.activate()
+    tb.init_datastore_v3_stub()
+    tb.init_memcache_stub()
+    tb.init_taskqueue_stub()
+    return tb
+
   def setUp(self):
     """Set up test framework. Configures basic environment variables and stubs."""
-    self.testbed = testbed.Testbed()
-    self.testbed.setup_env(app_id=self.APP_ID)
-    self.testbed.activate()
-    self.testbed.init_datastore_v3_stub()
-    self.testbed.init_memcache_stub()
-    self.testbed.init_taskqueue_stub()
+    if self._shared_testbed:
+      self.testbed = self._shared_testbed
+      self._reset_stubs()
+    else:
+      self.testbed = self._init_testbed()
 
     self._logger = logging.getLogger()
     self._old_log_level = self._logger.getEffectiveLevel()
@@ -32,7 +59,20 @@ class TestBase(unittest.TestCase):
   def tearDown(self):
     """Tear down test framework."""
     self._logger.setLevel(self._old_log_level)
-    self.testbed.deactivate()
+    if not self._shared_testbed:
+      self.testbed.deactivate()
+
+  def _reset_stubs(self):
+    """Clears data of the stubs shared between tests of a class"""
+    from google.appengine.api import memcache
+    from google.appengine.ext import ndb
+
+    self.testbed.get_stub(testbed.DATASTORE_SERVICE_NAME).Clear()
+    memcache.flush_all()
+    taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+    for queue in taskqueue.GetQueues():
+      taskqueue.FlushQueue(queue['name'])
+    ndb.get_context().clear_cache()
 
   def expectErrors(self):
     if self.isDefaultLogging():
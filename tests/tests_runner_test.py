@@ -0,0 +1,81 @@
+"""Tests for tests_runner.py and test_utils.TestBase"""
+
+import pickle
+import unittest
+from StringIO import StringIO
+from . import test_utils
+
+from google.appengine.api import memcache, taskqueue
+from google.appengine.ext import ndb, testbed
+
+import tests_runner
+
+
+class ReuseStubsModel(ndb.Model):
+  pass
+
+
+class ReuseStubsTests(test_utils.TestBase):
+  """Every test writes data, which the next one mustn't see"""
+  REUSE_STUBS = True
+
+  def assertEmptyStubs(self):
+    self.assertTrue(self.testbed is self._shared_testbed)
+    self.assertEqual(ReuseStubsModel.query().count(), 0)
+    self.assertEqual(memcache.get('reuse'), None)
+    stub = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+    self.assertEqual(stub.get_filtered_tasks(), [])
+
+  def fillStubs(self):
+    ReuseStubsModel(id='reuse').put()
+    memcache.set('reuse', 1)
+    taskqueue.add(url='/reuse')
+
+  def testOne(self):
+    self.assertEmptyStubs()
+    self.fillStubs()
+
+  def testTwo(self):
+    self.assertEmptyStubs()
+    self.fillStubs()
+
+  def testInContextCacheCleared(self):
+    self.assertEqual(ReuseStubsModel.get_by_id('reuse'), None)
+    self.fillStubs()
+    self.assertNotEqual(ReuseStubsModel.get_by_id('reuse'), None)
+
+
+class RunShardTests(test_utils.TestBase):
+  def testRunShard(self):
+    shard = tests_runner._run_shard(('tests_runner_test', 'ReuseStubsTests'))
+    self.assertEqual(shard.testsRun, 3)
+    self.assertEqual(shard.failures, [])
+    self.assertEqual(shard.errors, [])
+    self.assertEqual(len(shard.timings), 3)
+    # results are sent back from worker processes
+    self.assertEqual(pickle.loads(pickle.dumps(shard)).testsRun, 3)
+
+  def testImportError(self):
+    shard = tests_runner._run_shard(('no_such_test', 'NoSuchTests'))
+    self.assertEqual(shard.testsRun, 1)
+    self.assertEqual(len(shard.errors), 1)
+    self.assertEqual(shard.errors[0][0], 'no_such_test.NoSuchTests')
+
+  def testShardResult(self):
+    result = tests_runner.TimingTestResult(StringIO(), False, 0)
+    result.testsRun = 2
+    result.failures.append((tests_runner._ClassId('a.Tests.testA'), 'boom'))
+    result.timings.append(('a.Tests.testA', 0.5))
+    shard = tests_runner._ShardResult(result, 'output')
+    self.assertEqual(shard.failures, [('a.Tests.testA', 'boom')])
+    self.assertEqual(shard.errors, [])
+    self.assertEqual(shard.timings, [('a.Tests.testA', 0.5)])
+    self.assertEqual(shard.output, 'output')
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
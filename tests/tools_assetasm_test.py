@@ -0,0 +1,136 @@
+"""Tests for tools/assetasm.py"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from . import test_utils
+
+from tools import assetasm
+
+
+LAYOUT = '''<html><head>
+<link rel="stylesheet" href="/css/compiled-abc.css" type="text/css">
+<link rel="icon" href="/favicon.ico">
+<script src="/js/compiled-def.js"></script>
+<script src="//cdn.example.org/lib.js"></script>
+{% block head %}{% endblock %}</head></html>'''
+
+PAGE = '''{% extends 'layouts/default.html' %}
+{% block head %}<script src="/js/page.js"></script>{% endblock %}'''
+
+
+class HtmlMinifierTests(test_utils.TestBase):
+  def setUp(self):
+    super(HtmlMinifierTests, self).setUp()
+    self.minify = assetasm.HtmlMinifier().minify
+
+  def testBlockTags(self):
+    self.assertEqual(self.minify(u'<div>\n  <p>\n    text\n  </p>\n</div>\n'),
+                     u'<div><p>text</p></div>')
+    self.assertEqual(self.minify(u'<!DOCTYPE html>\n<html lang="{{ l }}">'),
+                     u'<!DOCTYPE html><html lang="{{ l }}">')
+
+  def testInlineTags(self):
+    self.assertEqual(self.minify(u'<a>foo</a>\n  <a>bar</a>'),
+                     u'<a>foo</a> <a>bar</a>')
+    self.assertEqual(self.minify(u'<b>a</b>  <em>b</em>\ttext'),
+                     u'<b>a</b> <em>b</em> text')
+
+  def testTextAndStatements(self):
+    self.assertEqual(
+      self.minify(u'<p>Hello\n  {% if user %}\n  {{ user.name }}\n{% endif %}</p>'),
+      u'<p>Hello {% if user %} {{ user.name }} {% endif %}</p>')
+    self.assertEqual(self.minify(u'a\n{# comment #}\nb'), u'a {# comment #} b')
+
+  def testWhitespaceControl(self):
+    self.assertEqual(
+      self.minify(u'{% if a -%}\n  <b>x</b>\n{%- endif %}\n{{- b }}'),
+      u'{% if a -%}<b>x</b>{%- endif %}{{- b }}')
+
+  def testVerbatimBlocks(self):
+    for block in [u'<pre>\n  a\n   b\n</pre>',
+                  u'<textarea name="t"> x\n  y</textarea>',
+                  u'<script>\n  var a  =  1;\n</script>',
+                  u'{% raw %}\n  {{ x }}\n{% endraw %}']:
+      self.assertEqual(self.minify(u'<b>x</b>%s' % block), u'<b>x</b>%s' % block)
+
+  def testPagination(self):
+    with open('templates/_pagination.html') as f:
+      minified = self.minify(f.read().decode('utf-8'))
+    self.assertTrue(u"{%- endif %} {% if page.has_next -%}" in minified)
+
+
+class PreloadMapTests(test_utils.TestBase):
+  def testExtractPreloads(self):
+    parent, assets = assetasm.extract_preloads(LAYOUT)
+    self.assertEqual(parent, None)
+    self.assertEqual(assets, [{'url': '/css/compiled-abc.css', 'as': 'style'},
+                              {'url': '/js/compiled-def.js', 'as': 'script'}])
+
+  def testFollowsExtends(self):
+    preloads = assetasm.preload_map({'layouts/default.html': LAYOUT,
+                                     'page.html': PAGE,
+                                     '_macros.html': '{% macro m() %}{% endmacro %}'})
+    self.assertEqual([a['url'] for a in preloads['page.html']],
+                     ['/css/compiled-abc.css', '/js/compiled-def.js', '/js/page.js'])
+    self.assertFalse('_macros.html' in preloads)
+
+
+class DepsBuilderTests(test_utils.TestBase):
+  def setUp(self):
+    super(DepsBuilderTests, self).setUp()
+    self.root = tempfile.mkdtemp()
+    self.write('app/main.js', "goog.provide('app.main');\n\n"
+                              "goog.require('goog.dom');\n"
+                              "goog.require(\"app.util\");\n")
+    self.write('app/util.js', "goog.provide('app.util');\n")
+    self.write('closure/goog/base.js', "goog.provide = function(name) {};\n")
+    self.write('closure/goog/dom.js', "goog.provide('goog.dom');\n")
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+    super(DepsBuilderTests, self).tearDown()
+
+  def write(self, path, data):
+    path = os.path.join(self.root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+      f.write(data)
+
+  def build(self):
+    builder = assetasm.DepsBuilder(self.root,
+                                   os.path.join(self.root, 'deps.js'))
+    builder._out = open(os.devnull, 'w')
+    builder.build()
+    with open(builder.dst) as f:
+      return builder.parsed, f.read()
+
+  def testBuild(self):
+    parsed, deps = self.build()
+    self.assertEqual(parsed, 3)
+    self.assertEqual(deps.splitlines(), [
+      "goog.addDependency('../../../app/main.js', ['app.main'], "
+        "['app.util', 'goog.dom']);",
+      "goog.addDependency('../../../app/util.js', ['app.util'], []);",
+      "goog.addDependency('../../../closure/goog/dom.js', ['goog.dom'], []);",
+    ])
+
+  def testParsesOnlyChangedFiles(self):
+    self.build()
+    self.assertEqual(self.build()[0], 0)
+
+    self.write('app/util.js', "goog.provide('app.util');\n"
+                              "goog.require('app.other');\n")
+    parsed, deps = self.build()
+    self.assertEqual(parsed, 1)
+    self.assertTrue("['app.util'], ['app.other']);" in deps)
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,117 @@
+"""Tests for tools/bulkdata.py against the datastore stub"""
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from . import test_utils
+
+from google.appengine.ext import ndb, testbed
+
+from tools import bulkdata
+from models.user import User
+
+
+class FailingExporter(bulkdata.Exporter):
+  """Gets interrupted after writing the first chunk"""
+  def write_chunk(self, name, lines):
+    if os.listdir(self.dirname) != [bulkdata.EXPORT_STATE]:
+      raise IOError('interrupted')
+    super(FailingExporter, self).write_chunk(name, lines)
+
+
+class FailingImporter(bulkdata.Importer):
+  """Gets interrupted after importing the first file"""
+  def import_file(self, name):
+    if self.state.data['done']:
+      raise IOError('interrupted')
+    return super(FailingImporter, self).import_file(name)
+
+
+class BulkdataTests(test_utils.TestBase):
+  def setUp(self):
+    super(BulkdataTests, self).setUp()
+    self.dirname = tempfile.mkdtemp()
+    users = [User(display_name='User %d' % i) for i in range(30)]
+    users.append(User(id='named', display_name='Named'))
+    self.keys = ndb.put_multi(users)
+
+  def tearDown(self):
+    shutil.rmtree(self.dirname)
+    super(BulkdataTests, self).tearDown()
+
+  def export(self, cls=bulkdata.Exporter):
+    return cls('User', self.dirname, shards=4, threads=2,
+               batch_size=7, batches_per_chunk=2).run()
+
+  def exportedKeys(self):
+    keys = []
+    for name in os.listdir(self.dirname):
+      if name.endswith('.ndjson.gz'):
+        f = gzip.open(os.path.join(self.dirname, name))
+        keys.extend(bulkdata.line_to_entity(line).key for line in f)
+        f.close()
+    return keys
+
+  def testExportImport(self):
+    self.assertEqual(self.export(), 31)
+    self.assertEqual(sorted(self.exportedKeys()), sorted(self.keys))
+
+    ndb.delete_multi(self.keys)
+    importer = bulkdata.Importer(self.dirname, threads=2, batch_size=10)
+    self.assertEqual(importer.run(), 31)
+    users = ndb.get_multi(self.keys)
+    self.assertEqual([u.display_name for u in users],
+                     ['User %d' % i for i in range(30)] + ['Named'])
+
+    # imported ids are never allocated again
+    new_key = User(display_name='New').put()
+    self.assertTrue(new_key.id() > max(k.id() for k in self.keys[:30]))
+
+  def testExportResumes(self):
+    self.assertRaises(IOError, self.export, FailingExporter)
+    self.assertEqual(len(self.exportedKeys()), 14)
+
+    self.assertEqual(self.export(), 31)
+    self.assertEqual(sorted(self.exportedKeys()), sorted(self.keys))
+    # finished exports aren't done again
+    self.assertEqual(self.export(), 31)
+    self.assertEqual(len(self.exportedKeys()), 31)
+
+  def testImportSkipsDoneFiles(self):
+    self.export()
+    self.assertEqual(bulkdata.Importer(self.dirname).run(), 31)
+    self.assertEqual(bulkdata.Importer(self.dirname).run(), 0)
+
+  def testImportResumes(self):
+    self.export()
+    # a fresh datastore, which hasn't allocated any ids yet
+    self.testbed.get_stub(testbed.DATASTORE_SERVICE_NAME).Clear()
+    importer = FailingImporter(self.dirname, threads=1)
+    self.assertRaises(IOError, importer.run)
+    done = importer.state.data['done']
+    self.assertEqual(len(done), 1)
+
+    # ids of the imported file are reserved although the import didn't finish
+    f = gzip.open(os.path.join(self.dirname, done[0]))
+    ids = [bulkdata.line_to_entity(line).key.id() for line in f]
+    f.close()
+    new_key = User(display_name='New').put()
+    self.assertTrue(new_key.id() > max(i for i in ids if isinstance(i, (int, long))))
+
+    self.assertEqual(bulkdata.Importer(self.dirname).run(), 31 - len(ids))
+    self.assertEqual(len(ndb.get_multi(self.keys)), 31)
+
+  def testKindMismatch(self):
+    self.export()
+    exporter = bulkdata.Exporter('Other', self.dirname)
+    self.assertRaises(ValueError, exporter.run)
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -3,6 +3,8 @@
 import unittest
 from . import test_utils
 
+import cache
+from models import user as user_module
 from models.user import User
 from google.appengine.api.datastore_errors import BadValueError
 
@@ -13,6 +15,67 @@ class UserModelTests(test_utils.TestBase):
     self.assertRaisesRegexp(BadValueError, 'display_name', u.put)
 
 
+class UserTokensTests(test_utils.TestBase):
+  def setUp(self):
+    super(UserTokensTests, self).setUp()
+    self.user_id = User(display_name='Tester').put().id()
+    user_module._token_cache.lru.clear()
+
+  def testAuthToken(self):
+    token = User.create_auth_token(self.user_id)
+    user, ts = User.get_by_auth_token(self.user_id, token)
+    self.assertEqual(user.key.id(), self.user_id)
+    self.assertTrue(ts)
+
+    # revoked at once, although it was cached
+    User.delete_auth_token(self.user_id, token)
+    self.assertFalse(User.validate_token(self.user_id, 'auth', token))
+
+  def testDeleteWhileValidating(self):
+    token = User.create_auth_token(self.user_id)
+    key = '%s:auth:%s' % (self.user_id, token)
+    user_module._token_cache.delete(key)
+    # a request reads the token entity, then another one logs out...
+    orig_add = user_module._token_cache.add
+    def add(key, value, ttl):
+      User.delete_auth_token(self.user_id, token)
+      return orig_add(key, value, ttl)
+    user_module._token_cache.add = add
+    try:
+      # ...before the first one caches it
+      self.assertFalse(User.validate_token(self.user_id, 'auth', token))
+    finally:
+      del user_module._token_cache.add
+    self.assertFalse(User.validate_token(self.user_id, 'auth', token))
+
+  def testDeleteAuthToken(self):
+    token = User.create_auth_token(self.user_id)
+    User.delete_auth_token(self.user_id, token)
+    self.assertEqual(User.get_by_auth_token(self.user_id, token), (None, None))
+
+  def testDeleteOnAnotherInstance(self):
+    token = User.create_auth_token(self.user_id)
+    this_instance = user_module._token_cache
+    other_instance = cache.TwoLevelCache(this_instance.namespace,
+      local_ttl=this_instance.local_ttl, keep_local=this_instance.keep_local)
+
+    user_module._token_cache = other_instance
+    try:
+      self.assertTrue(User.validate_token(self.user_id, 'auth', token))
+      user_module._token_cache = this_instance
+      User.delete_auth_token(self.user_id, token)
+      user_module._token_cache = other_instance
+      self.assertFalse(User.validate_token(self.user_id, 'auth', token))
+    finally:
+      user_module._token_cache = this_instance
+
+  def testNegativeCaching(self):
+    self.assertFalse(User.validate_token(self.user_id, 'auth', 'bogus'))
+    stats = user_module._token_cache.stats()
+    self.assertFalse(User.validate_token(self.user_id, 'auth', 'bogus'))
+    self.assertEqual(user_module._token_cache.stats()['hits'], stats['hits'] + 1)
+
+
 def main():
   unittest.main()
 
@@ -1,35 +1,191 @@
-"""Run all unittests."""
+"""Run all unittests.
+
+Usage:
+  tests_runner.py [-v|-q] [-j N] [--slowest N]
+
+  -j N         shard test classes across N worker processes. Each worker
+               runs its own testbed (and in-memory datastore) per test class.
+  --slowest N  report N slowest tests, default 10.
+"""
 
 import os
 import sys
+import time
 import unittest
+import traceback
+
 
-def load_tests():
+def load_test_classes():
+  """Returns a list of (module_name, class_name) of all test cases"""
   test_mods = [f[:-3] for f in os.listdir('tests') if f.endswith('_test.py')]
   apptests = __import__('tests', fromlist=test_mods, level=1)
 
+  classes = []
+  for mod_name in sorted(test_mods):
+    mod = getattr(apptests, mod_name)
+    for name in sorted(set(dir(mod))):
+      if name.endswith('Tests'):
+        classes.append((mod_name, name))
+  return classes
+
+
+def _get_class(mod_name, class_name):
+  apptests = __import__('tests', fromlist=[mod_name], level=1)
+  return getattr(getattr(apptests, mod_name), class_name)
+
+
+def load_tests(classes=None):
   loader = unittest.TestLoader()
   suite = unittest.TestSuite()
 
-  for mod in [getattr(apptests, name) for name in test_mods]:
-    for name in set(dir(mod)):
-      if name.endswith('Tests'):
-        test_module = getattr(mod, name)
-        tests = loader.loadTestsFromTestCase(test_module)
-        suite.addTests(tests)
+  for mod_name, class_name in classes or load_test_classes():
+    tests = loader.loadTestsFromTestCase(_get_class(mod_name, class_name))
+    suite.addTests(tests)
 
   return suite
 
 
+class TimingTestResult(unittest.TextTestResult):
+  """Text test result which also records each test duration"""
+
+  def __init__(self, *args, **kwargs):
+    super(TimingTestResult, self).__init__(*args, **kwargs)
+    self.timings = []
+
+  def startTest(self, test):
+    self._started_at = time.time()
+    super(TimingTestResult, self).startTest(test)
+
+  def stopTest(self, test):
+    super(TimingTestResult, self).stopTest(test)
+    self.timings.append((test.id(), time.time() - self._started_at))
+
+
+class _ShardResult(object):
+  """Picklable summary of a test run in a worker process"""
+
+  def __init__(self, result, output):
+    self.testsRun = result.testsRun
+    self.failures = [(t.id(), err) for t, err in result.failures]
+    self.errors = [(t.id(), err) for t, err in result.errors]
+    self.skipped = len(result.skipped)
+    self.timings = result.timings
+    self.output = output
+
+
+class _ClassId(object):
+  def __init__(self, name):
+    self._name = name
+
+  def id(self):
+    return self._name
+
+
+def _run_shard(test_class):
+  """Worker entry point: runs a single test class and returns _ShardResult"""
+  from StringIO import StringIO
+  stream = StringIO()
+  try:
+    suite = load_tests([test_class])
+    runner = unittest.TextTestRunner(stream=stream, verbosity=0,
+                                     resultclass=TimingTestResult)
+    return _ShardResult(runner.run(suite), stream.getvalue())
+  except Exception:
+    # make sure the parent process gets to know about e.g. import errors
+    result = TimingTestResult(stream, False, 0)
+    result.testsRun = 1
+    result.errors.append((_ClassId('%s.%s' % test_class),
+                          traceback.format_exc()))
+    return _ShardResult(result, stream.getvalue())
+
+
+def run_parallel(jobs, verbosity):
+  """Runs test classes in a pool of jobs worker processes.
+
+  Returns a list of _ShardResult.
+  """
+  import multiprocessing
+
+  classes = load_test_classes()
+  pool = multiprocessing.Pool(processes=jobs)
+  results = []
+  started = time.time()
+  try:
+    # chunksize=1 hands out one class at a time, so that slow classes
+    # don't hold back a whole pre-computed shard.
+    for shard in pool.imap_unordered(_run_shard, classes, chunksize=1):
+      if verbosity > 1:
+        sys.stderr.write(shard.output)
+      elif verbosity:
+        sys.stderr.write('F' if shard.failures else
+                         'E' if shard.errors else '.')
+      results.append(shard)
+    pool.close()
+  except KeyboardInterrupt:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+  elapsed = time.time() - started
+  run = sum(r.testsRun for r in results)
+  failures = [f for r in results for f in r.failures]
+  errors = [e for r in results for e in r.errors]
+
+  sys.stderr.write('\n')
+  for kind, items in (('ERROR', errors), ('FAIL', failures)):
+    for test_id, err in items:
+      sys.stderr.write('=' * 70 + '\n%s: %s\n' % (kind, test_id))
+      sys.stderr.write('-' * 70 + '\n%s\n' % err)
+  sys.stderr.write('-' * 70 + '\n')
+  sys.stderr.write('Ran %d test%s in %.3fs (%d classes, %d workers)\n\n' % (
+    run, run != 1 and 's' or '', elapsed, len(classes), jobs))
+  if failures or errors:
+    sys.stderr.write('FAILED (failures=%d, errors=%d)\n' % (
+      len(failures), len(errors)))
+  else:
+    sys.stderr.write('OK\n')
+
+  return results
+
+
+def report_slowest(timings, count):
+  if not count or not timings:
+    return
+  sys.stderr.write('\nSlowest %d tests:\n' % min(count, len(timings)))
+  for test_id, duration in sorted(timings, key=lambda t: -t[1])[:count]:
+    sys.stderr.write('  %8.3fs  %s\n' % (duration, test_id))
+
+
 def main():
   v = 1
-  for arg in sys.argv[1:]:
+  jobs = 1
+  slowest = 10
+  args = sys.argv[1:]
+  while args:
+    arg = args.pop(0)
     if arg.startswith('-v'):
       v += arg.count('v')
     elif arg == '-q':
       v = 0
-  result = unittest.TextTestRunner(verbosity=v).run(load_tests())
-  sys.exit(not result.wasSuccessful())
+    elif arg.startswith('-j'):
+      jobs = int(arg[2:] or args.pop(0))
+    elif arg == '--slowest':
+      slowest = int(args.pop(0))
+
+  if jobs > 1:
+    results = run_parallel(jobs, v)
+    timings = [t for r in results for t in r.timings]
+    success = not any(r.failures or r.errors for r in results)
+  else:
+    result = unittest.TextTestRunner(verbosity=v,
+      resultclass=TimingTestResult).run(load_tests())
+    timings = result.timings
+    success = result.wasSuccessful()
+
+  if v:
+    report_slowest(timings, slowest)
+  sys.exit(not success)
 
 
 if __name__ == '__main__':
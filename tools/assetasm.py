@@ -47,6 +47,13 @@ in the templates.
 
 - <!-- comments --> and `data-build` attributes will be stripped
 
+- stylesheets and scripts of every built template (and the templates
+  it extends) are listed in _preload.json of the output dir, which
+  BaseHandler.render() turns into "Link: <url>; rel=preload" headers
+
+- whitespace of built templates is collapsed, except for <pre>, <textarea>,
+  <script> and {% raw %} blocks (see HtmlMinifier). Disable it with --no-minify.
+
 Notes:
   - Always place data-build as the last attribute of a tag.
   - data-build and class attribute values should be in double quotes, e.g.
@@ -60,6 +67,8 @@ what:
   "static"        - work only with static assets
   "templates"     - work with HTML/Jinja templates. This implies
                     bulding static assets too (if needed)
+  "jsdeps"        - generate Closure deps.js (see DepsBuilder), parsing
+                    only files that changed since the last run
 cmd:
   "manifest"  will list all hashed version of assets in JSON format.
   "check"     will check changes in the src tree and exit with -1, if any.
@@ -188,6 +197,91 @@ class Replacer(object):
     self.data = u''.join(frags)
 
 
+#
+# Jinja2-aware HTML minifier
+#
+
+class HtmlMinifier(object):
+  """
+  Collapses whitespace of HTML/Jinja2 templates without changing how
+  pages render:
+
+  - contents of <pre>, <textarea>, <script> and {% raw %} blocks is kept as is
+  - {{ ... }}, {% ... %} and {# ... #} constructs are never changed
+  - whitespace runs next to block-level (or <head>) tags are dropped, as
+    browsers don't render them, and so are those next to the "-" side of
+    Jinja2 tags ({%- ... -%}), which Jinja2 would strip at render time
+  - any other whitespace run is collapsed into a single space, e.g.
+    between inline tags, text, {{ expressions }} and {% statements %}
+  """
+  _RE_TOKENS = re.compile(r'''
+      (?P<verbatim>
+        <(?P<tag>pre|textarea|script)\b.*?</(?P=tag)\s*>
+      | {%-?\s*raw\s*-?%}.*?{%-?\s*endraw\s*-?%})
+    | (?P<jinja>{%.*?%}|{\#.*?\#}|{{.*?}})
+  ''', re.DOTALL | re.I | re.X)
+
+  _RE_WHITESPACE = re.compile(r'\s+')
+  _RE_TAG_START = re.compile(r'</?([a-zA-Z][a-zA-Z0-9]*)\b')
+  _RE_TAG = re.compile(_RE_TAG_START.pattern + r'[^<>]*>')
+
+  # whitespace next to these tags doesn't render
+  BLOCK_TAGS = frozenset('''
+    html head body title meta link base style
+    address article aside blockquote caption col colgroup dd details dialog
+    div dl dt fieldset figcaption figure footer form h1 h2 h3 h4 h5 h6
+    header hgroup hr legend li main menu nav ol optgroup option p pre
+    section summary table tbody td tfoot th thead tr ul
+  '''.split())
+
+  def minify(self, data):
+    """Returns minified version of data"""
+    tokens = []
+    pos = 0
+    for m in self._RE_TOKENS.finditer(data):
+      if m.start() > pos:
+        tokens.append(['text', data[pos:m.start()]])
+      tokens.append([m.group('verbatim') and 'verbatim' or 'jinja', m.group(0)])
+      pos = m.end()
+    if pos < len(data):
+      tokens.append(['text', data[pos:]])
+
+    for i, token in enumerate(tokens):
+      if token[0] != 'text':
+        continue
+      prev = i > 0 and tokens[i - 1][1] or ''
+      next = i + 1 < len(tokens) and tokens[i + 1][1] or ''
+      token[1] = self._collapse(token[1], prev, next)
+
+    return u''.join(text for kind, text in tokens)
+
+  def _collapse(self, text, prev, next):
+    """Collapses whitespace runs of text found between prev and next tokens"""
+    def repl(m):
+      before = text[:m.start()] or prev
+      after = text[m.end():] or next
+      if self._ends_with_block_tag(before) or \
+          self._starts_with_block_tag(after):
+        return ''
+      if not m.start() and prev[-3:] in ('-%}', '-#}', '-}}'):
+        return ''
+      if m.end() == len(text) and next[:3] in ('{%-', '{#-', '{{-'):
+        return ''
+      return ' '
+    return self._RE_WHITESPACE.sub(repl, text)
+
+  def _starts_with_block_tag(self, data):
+    m = self._RE_TAG_START.match(data)
+    return bool(m) and m.group(1).lower() in self.BLOCK_TAGS
+
+  def _ends_with_block_tag(self, data):
+    if not data.endswith('>'):
+      return False
+    m = self._RE_TAG.match(data, data.rfind('<'))
+    return bool(m) and m.end() == len(data) and \
+      m.group(1).lower() in self.BLOCK_TAGS
+
+
 #
 # Simple filesystem walker
 #
@@ -526,14 +620,73 @@ class StaticBuilder(AbstractBuilder):
 # Templates builder, on top of Abstract builder
 #
 
+#
+# Preload map of templates
+#
+
+# Name of the file with assets to preload, per built template
+PRELOAD_MAP = '_preload.json'
+
+_RE_EXTENDS = re.compile(r'{%-?\s*extends\s+[\'"]([^\'"]+)[\'"]')
+_RE_STYLESHEET = re.compile(r'<link [^>]*rel="stylesheet"[^>]*>')
+_RE_SCRIPT = re.compile(r'<script [^>]*src="([^"]+)"')
+_RE_HREF = re.compile(r'href="([^"]+)"')
+
+
+def extract_preloads(data):
+  """Returns (extended template or None, list of assets) of a template,
+  where assets are {"url": ..., "as": "style"|"script"} dicts of local
+  stylesheets and scripts, in order of appearance.
+  """
+  found = []
+  for m in _RE_STYLESHEET.finditer(data):
+    href = _RE_HREF.search(m.group(0))
+    if href:
+      found.append((m.start(), href.group(1), 'style'))
+  for m in _RE_SCRIPT.finditer(data):
+    found.append((m.start(), m.group(1), 'script'))
+
+  assets = [{'url': url, 'as': kind} for _, url, kind in sorted(found)
+            if url.startswith('/') and not url.startswith('//')]
+  extends = _RE_EXTENDS.search(data)
+  return extends and extends.group(1), assets
+
+
+def preload_map(templates):
+  """Returns a dict of template name => assets to preload, following
+  {% extends %} (parent's assets first). templates is a dict of
+  template name => its (built) content.
+  """
+  parsed = dict((name, extract_preloads(data))
+                for name, data in templates.items())
+
+  def collect(name, seen):
+    if name not in parsed or name in seen:
+      return []
+    seen.add(name)
+    parent, assets = parsed[name]
+    collected = collect(parent, seen) if parent else []
+    return collected + [a for a in assets if a not in collected]
+
+  result = {}
+  for name in parsed:
+    assets = collect(name, set())
+    if assets:
+      result[name] = assets
+  return result
+
+
 class TemplatesBuilder(AbstractBuilder):
   """HTML templates builder.
 
   See module description for details.
   """
-  def __init__(self, src, dst, static_builder, cssmap=None, **kwargs):
+  def __init__(self, src, dst, static_builder, cssmap=None, minify=True,
+    **kwargs):
     super(TemplatesBuilder, self).__init__(src, dst, **kwargs)
     self.__static_builder = static_builder
+    self._minifier = minify and HtmlMinifier() or None
+    self._bytes_saved = 0
     try:
       self._cssmap = json.loads(open(cssmap).read())
     except:
@@ -559,9 +712,31 @@ class TemplatesBuilder(AbstractBuilder):
         srcpath = os.path.join(self.src, filepath)
         dstpath = os.path.join(self.dst, filepath)
         self._process_template(srcpath, dstpath)
+
+    if self._minifier:
+      self._out.write("Minification saved %d bytes\n" % self._bytes_saved)
+    self._write_preload_map()
     # success
     return True
 
+  def _write_preload_map(self):
+    """Writes assets to preload per template, see BaseHandler.render()"""
+    import codecs
+
+    templates = {}
+    for filepath in self.manifest():
+      if filepath.endswith('.html'):
+        dstpath = os.path.join(self.dst, filepath)
+        if os.path.exists(dstpath):
+          templates[filepath] = codecs.open(dstpath, encoding='utf-8').read()
+
+    preloads = preload_map(templates)
+    target = os.path.join(self.dst, PRELOAD_MAP)
+    with open(target, 'w') as f:
+      json.dump(preloads, f, **_JSON_DUMP_ARGS)
+    self._out.write("Preload map of %d templates => %s\n" % (
+      len(preloads), target))
+
 
   _BUILD_ATTR_NAME = 'data-build'
 
@@ -628,6 +803,14 @@ class TemplatesBuilder(AbstractBuilder):
         lambda m: ' class="%s"' % self._css_class_from_map(m.group(1))
       )
 
+    if self._minifier:
+      size = len(repl.data.encode('utf-8'))
+      repl.data = self._minifier.minify(repl.data)
+      saved = size - len(repl.data.encode('utf-8'))
+      self._bytes_saved += saved
+      self._out.write("   minified: %d => %d bytes (-%d)\n" % (
+        size, size - saved, saved))
+
     # store processed template string
     f = codecs.open(target, mode='w', encoding='utf-8')
     f.write(repl.data)
@@ -679,6 +862,114 @@ class TemplatesBuilder(AbstractBuilder):
     return ' '.join(classes_list)
 
 
+#
+# Closure deps.js builder
+#
+
+# Files never listed in deps.js: dotfiles, deps files and Closure's base.js
+_RE_IGNORE_JSDEPS = [
+  re.compile('^(.*/)?\..*'),
+  re.compile('^(.*/)?deps\.js$'),
+  re.compile('^(.*/)?closure/goog/base\.js$'),
+]
+
+_RE_PROVIDE = re.compile(r'^\s*goog\.provide\(\s*[\'"](.+)[\'"]\s*\)', re.M)
+_RE_REQUIRE = re.compile(r'^\s*goog\.require\(\s*[\'"](.+)[\'"]\s*\)', re.M)
+
+
+class DepsBuilder(AbstractBuilder):
+  """Closure Library deps.js builder, a faster depswriter.py.
+
+  Provides and requires of every .js file are cached (along with its
+  timestamp, size and hash) in a cache file in src dir. Only files which
+  changed since the last build are parsed again, and deps.js (dst) is
+  only written if its contents changed.
+  """
+  CACHE_FILE = '.deps-cache.json'
+
+  def __init__(self, src, dst, prefix='../../../', **kwargs):
+    kwargs.setdefault('ignore_patterns', _RE_IGNORE_JSDEPS)
+    super(DepsBuilder, self).__init__(src, dst, **kwargs)
+    self.prefix = prefix
+    self.cache_path = os.path.join(self.src, self.CACHE_FILE)
+    self.parsed = 0
+    self._cache = None
+
+  def load_cache(self):
+    """Returns the manifest of the last build, or an empty dict"""
+    if self._cache is None:
+      try:
+        with open(self.cache_path) as f:
+          self._cache = json.load(f)
+      except (IOError, ValueError):
+        self._cache = {}
+    return self._cache
+
+  def manifest(self):
+    """Returns a dict of .js file path => ts, size, hash, provides, requires.
+    Files are read only if their timestamp or size changed.
+    """
+    cache = self.load_cache()
+    manifest = {}
+    for path, ts, size in self.dirwalker.walk():
+      if not path.endswith('.js'):
+        continue
+      info = cache.get(path)
+      if not info or info['ts'] != ts or info['size'] != size:
+        info = self._parse(path, ts, size, info)
+      manifest[path] = info
+    return manifest
+
+  def _parse(self, path, ts, size, cached=None):
+    filepath = os.path.join(self.src, path)
+    data = self._read_contents(filepath)
+    digest = hashlib.sha1(data).hexdigest()[:8]
+    if cached and cached['hash'] == digest:
+      # touched but not changed
+      cached.update(ts=ts, size=size)
+      return cached
+    self.parsed += 1
+    return {
+      'ts': ts, 'size': size, 'hash': digest,
+      'provides': sorted(set(_RE_PROVIDE.findall(data))),
+      'requires': sorted(set(_RE_REQUIRE.findall(data))),
+    }
+
+  def deps(self, manifest):
+    """Returns deps.js contents"""
+    lines = []
+    for path in sorted(manifest):
+      info = manifest[path]
+      if info['provides']:
+        lines.append("goog.addDependency('%s%s', %s, %s);\n" % (
+          self.prefix, path, self._to_js(info['provides']),
+          self._to_js(info['requires'])))
+    return ''.join(lines)
+
+  def _to_js(self, names):
+    return json.dumps(names).replace('"', "'")
+
+  def build(self):
+    """Writes deps.js and updates the cache. Returns True."""
+    manifest = self.manifest()
+    deps = self.deps(manifest)
+    old = os.path.exists(self.dst) and self._read_contents(self.dst)
+    if deps != old:
+      with open(self.dst, 'w') as f:
+        f.write(deps)
+    with open(self.cache_path, 'w') as f:
+      json.dump(manifest, f)
+    self._cache = manifest
+    self._out.write("Deps of %d files => %s (%d parsed, %s)\n" % (
+      len(manifest), self.dst, self.parsed,
+      deps != old and 'updated' or 'unchanged'))
+    return True
+
+  def _has_changes(self, filepath, info):
+    cached = self.load_cache().get(filepath)
+    return not cached or cached['hash'] != info['hash']
+
+
 #
 # Main entry point for command line
 #
@@ -688,7 +979,7 @@ def main():
 
   parser = argparse.ArgumentParser(
     description='Static assets and HTML templates builder/compiler')
-  parser.add_argument('what', choices=['static', 'templates'])
+  parser.add_argument('what', choices=['static', 'templates', 'jsdeps'])
   parser.add_argument('cmd', choices=['manifest', 'check', 'build'])
   parser.add_argument('--static-src', default='assets')
   parser.add_argument('--static-dst', default='.assets-build')
@@ -699,8 +990,21 @@ def main():
   parser.add_argument('--compiler-jar', help="Path to Closure Compiler jar")
   parser.add_argument('--cssmap', 
     help="Path to a CSS renaming map (JSON) obtained with make css-map")
+  parser.add_argument('--no-minify', dest='minify', action='store_false',
+    help="Don't collapse whitespace of built templates")
+  parser.add_argument('--js-src', default='assets/js',
+    help="Root of Javascript files to compute Closure deps of")
+  parser.add_argument('--deps-file', default='assets/js/deps.js')
+  parser.add_argument('--deps-prefix', default='../../../',
+    help="Path of --js-src relative to Closure's base.js")
   args = parser.parse_args()
 
+  if args.what == 'jsdeps':
+    builder = DepsBuilder(args.js_src, args.deps_file, prefix=args.deps_prefix,
+      ignore_patterns=_RE_IGNORE_JSDEPS + args.ignore)
+    getattr(builder, 'do_%s' % args.cmd)()
+    return
+
   ignore = _RE_IGNORE + args.ignore
   
   _static = StaticBuilder(
@@ -713,7 +1017,7 @@ def main():
     builder = TemplatesBuilder(
       args.templates_src, args.templates_dst, 
       _static, ignore_patterns=ignore, compiler_jar=args.compiler_jar,
-      cssmap=args.cssmap)
+      cssmap=args.cssmap, minify=args.minify)
 
   meth = 'do_%s' % args.cmd
   getattr(builder, meth)()
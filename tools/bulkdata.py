@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""Bulk export/import of datastore entities, over remote_api.
+
+Export splits the keyspace of a kind into key ranges (see lib/keyranges.py),
+fetched in parallel by a pool of threads with query cursors, batch_size
+entities at a time. Every range is written to gzipped, newline-delimited
+JSON chunk files in the output dir:
+
+  <dir>/<kind>-<range>-<chunk>.ndjson.gz
+
+one line per entity: {"key": <urlsafe key>, "pb": <base64 entity protobuf>}
+
+Progress (ranges, cursors and chunk files written) is saved in
+<dir>/_state.json after each chunk, so that running an interrupted export
+again with the same arguments resumes where it left off.
+
+Import puts entities of all chunk files in a dir with put_multi, a file per
+thread at a time. Finished files are listed in <dir>/_import_state.json,
+re-importing a file is harmless. Keys are rebuilt for the target app and ids
+of imported root entities are allocated so that new entities won't collide
+with them. Note that KeyProperty values still refer to the source app.
+
+Command line arguments:
+  export <kind> <dir> [-s host] [--shards N] [--threads N] [--batch-size N]
+  import <dir> [-s host] [--threads N] [--batch-size N]
+
+Model classes of exported/imported kinds must be importable, see --models.
+Host defaults to the dev server, e.g.
+
+  make bulk FLAGS="export User tmp/users -s myapp.appspot.com --shards 16"
+
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import base64
+import getpass
+import logging
+import argparse
+import threading
+from multiprocessing.pool import ThreadPool
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_ROOT not in sys.path:
+  sys.path[0:0] = [APP_ROOT, os.path.join(APP_ROOT, 'lib')]
+
+from google.appengine.ext import ndb
+from google.appengine.datastore import entity_pb
+from google.appengine.datastore.datastore_query import Cursor
+
+import keyranges
+
+EXPORT_STATE = '_state.json'
+IMPORT_STATE = '_import_state.json'
+CHUNK_FILES = '*.ndjson.gz'
+
+_adapter = ndb.ModelAdapter()
+
+
+def connect(host, path='/_ah/remote_api'):
+  """Routes datastore calls of this process to host's remote_api"""
+  from google.appengine.ext.remote_api import remote_api_stub
+  def auth_func():
+    return raw_input('Email: '), getpass.getpass('Password: ')
+  secure = not host.startswith('localhost')
+  remote_api_stub.ConfigureRemoteApi(None, path, auth_func, host,
+                                     secure=secure, save_cookies=True)
+
+
+def entity_to_line(entity):
+  pb = _adapter.entity_to_pb(entity).Encode()
+  return json.dumps({'key': entity.key.urlsafe(),
+                     'pb': base64.b64encode(pb)})
+
+
+def line_to_entity(line):
+  """Returns an entity with its key rebuilt for the current app"""
+  pb = entity_pb.EntityProto(base64.b64decode(json.loads(line)['pb']))
+  entity = _adapter.pb_to_entity(pb)
+  key = entity.key
+  entity.key = ndb.Key(flat=key.flat(), namespace=key.namespace())
+  return entity
+
+
+def _bulk_context():
+  """Bulk reads/writes only waste time and memory on caching"""
+  ctx = ndb.get_context()
+  ctx.set_cache_policy(False)
+  ctx.set_memcache_policy(False)
+
+
+class State(object):
+  """JSON progress file, shared by worker threads"""
+  def __init__(self, path, initial):
+    self.path = path
+    self.lock = threading.Lock()
+    self.data = initial
+    if os.path.exists(path):
+      with open(path) as f:
+        self.data = json.load(f)
+
+  def save(self):
+    with self.lock:
+      tmp = self.path + '.tmp'
+      with open(tmp, 'w') as f:
+        json.dump(self.data, f, indent=2)
+      os.rename(tmp, self.path)
+
+
+class Exporter(object):
+  def __init__(self, kind, dirname, shards=8, threads=8, batch_size=500,
+               batches_per_chunk=20):
+    self.kind = kind
+    self.dirname = dirname
+    self.shards = shards
+    self.threads = threads
+    self.batch_size = batch_size
+    self.batches_per_chunk = batches_per_chunk
+
+  def run(self):
+    """Exports all entities of kind, returns their number"""
+    if not os.path.isdir(self.dirname):
+      os.makedirs(self.dirname)
+    self.state = State(os.path.join(self.dirname, EXPORT_STATE),
+                       {'kind': self.kind, 'ranges': []})
+    if self.state.data['kind'] != self.kind:
+      raise ValueError('%s has an export of %s' %
+                       (self.dirname, self.state.data['kind']))
+
+    if not self.state.data['ranges']:
+      _bulk_context()
+      ranges = keyranges.split(ndb.Query(kind=self.kind), self.shards)
+      self.state.data['ranges'] = [{
+        'start': start and start.urlsafe(), 'end': end and end.urlsafe(),
+        'cursor': None, 'chunks': [], 'count': 0, 'done': False
+      } for start, end in ranges]
+      self.state.save()
+
+    ranges = self.state.data['ranges']
+    pool = ThreadPool(min(self.threads, len(ranges)))
+    try:
+      return sum(pool.map(self.export_range, range(len(ranges)), chunksize=1))
+    finally:
+      pool.close()
+
+  def export_range(self, index):
+    _bulk_context()
+    r = self.state.data['ranges'][index]
+    query = keyranges.restrict(ndb.Query(kind=self.kind),
+      r['start'] and ndb.Key(urlsafe=r['start']),
+      r['end'] and ndb.Key(urlsafe=r['end']))
+    cursor = r['cursor'] and Cursor(urlsafe=r['cursor'])
+
+    while not r['done']:
+      lines, more = [], True
+      for _ in xrange(self.batches_per_chunk):
+        entities, cursor, more = query.fetch_page(self.batch_size,
+                                                  start_cursor=cursor)
+        lines.extend(entity_to_line(e) for e in entities)
+        if not more or not cursor:
+          more = False
+          break
+
+      name = '%s-%04d-%05d.ndjson.gz' % (self.kind, index, len(r['chunks']))
+      if lines:
+        self.write_chunk(name, lines)
+      with self.state.lock:
+        if lines:
+          r['chunks'].append(name)
+        r['cursor'] = cursor and cursor.urlsafe()
+        r['count'] += len(lines)
+        r['done'] = not more
+      self.state.save()
+    return r['count']
+
+  def write_chunk(self, name, lines):
+    """Chunks appear complete or not at all"""
+    path = os.path.join(self.dirname, name)
+    f = gzip.open(path + '.tmp', 'wb')
+    try:
+      for line in lines:
+        f.write(line + '\n')
+    finally:
+      f.close()
+    os.rename(path + '.tmp', path)
+
+
+class Importer(object):
+  def __init__(self, dirname, threads=8, batch_size=500):
+    self.dirname = dirname
+    self.threads = threads
+    self.batch_size = batch_size
+
+  def run(self):
+    """Imports all chunk files of dirname, returns number of entities"""
+    self.state = State(os.path.join(self.dirname, IMPORT_STATE), {'done': []})
+    done = set(self.state.data['done'])
+    names = sorted(os.path.basename(p) for p in
+                   glob.glob(os.path.join(self.dirname, CHUNK_FILES)))
+    names = [n for n in names if n not in done]
+
+    if not names:
+      return 0
+    pool = ThreadPool(min(self.threads, len(names)))
+    try:
+      return sum(pool.map(self.import_file, names, chunksize=1))
+    finally:
+      pool.close()
+
+  def import_file(self, name):
+    _bulk_context()
+    count, batch, max_ids = 0, [], {}
+    f = gzip.open(os.path.join(self.dirname, name), 'rb')
+    try:
+      for line in f:
+        entity = line_to_entity(line)
+        key = entity.key
+        if key.parent() is None and isinstance(key.id(), (int, long)):
+          max_ids[key.kind()] = max(max_ids.get(key.kind(), 0), key.id())
+        batch.append(entity)
+        if len(batch) >= self.batch_size:
+          ndb.put_multi(batch)
+          count += len(batch)
+          batch = []
+      if batch:
+        ndb.put_multi(batch)
+        count += len(batch)
+    finally:
+      f.close()
+
+    # before the file is marked as done: imported ids must never be
+    # allocated again, even if the import gets interrupted
+    for kind, max_id in max_ids.iteritems():
+      ndb.get_context().allocate_ids(ndb.Key(kind, None), max=max_id).get_result()
+
+    with self.state.lock:
+      self.state.data['done'].append(name)
+    self.state.save()
+    return count
+
+
+#
+# Main entry point for command line
+#
+
+def main():
+  """Main entry point for command-line usage"""
+  parser = argparse.ArgumentParser(
+    description='Parallel bulk export/import of datastore entities')
+  parser.add_argument('cmd', choices=['export', 'import'])
+  parser.add_argument('args', nargs='+', help='<kind> <dir> or <dir>')
+  parser.add_argument('-s', '--host', default='localhost:8080')
+  parser.add_argument('--models', action='append', default=['models'],
+    help="Modules to import so that kinds map to their model classes")
+  parser.add_argument('--shards', type=int, default=8)
+  parser.add_argument('--threads', type=int, default=8)
+  parser.add_argument('--batch-size', type=int, default=500)
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.INFO)
+
+  for mod in args.models:
+    __import__(mod)
+  connect(args.host)
+
+  started = time.time()
+  if args.cmd == 'export':
+    if len(args.args) != 2:
+      parser.error('export needs <kind> <dir>')
+    count = Exporter(args.args[0], args.args[1], shards=args.shards,
+      threads=args.threads, batch_size=args.batch_size).run()
+  else:
+    if len(args.args) != 1:
+      parser.error('import needs <dir>')
+    count = Importer(args.args[0], threads=args.threads,
+      batch_size=args.batch_size).run()
+
+  elapsed = time.time() - started
+  logging.info('%sed %d entities in %.1fs (%.0f/s)', args.cmd, count,
+               elapsed, count / max(elapsed, 0.001))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""Import time profiler of the app cold start.
+
+Measures what a fresh instance goes through before serving its first
+request, in phases:
+
+  appengine_config  - imported by the runtime first
+  main              - import of main.app (see app.yaml)
+  first_request     - handling of the first request, which imports
+                      handlers and whatever they use
+
+and reports the total time of every phase along with the modules that took
+longest to import (self time, without nested imports). Testbed stubs are
+set up before profiling, so the SDK modules they import aren't counted.
+
+Command line arguments:
+  [-h] [--path /] [--top 20] [--json] [--check]
+
+With --json, prints results in JSON format (see tests/cold_start_test.py
+which enforces LAZY_MODULES, and the budget if COLD_START_BUDGET_MS env
+var is set). With --check, exits with status 1 if the cold start took
+longer than COLD_START_BUDGET_MS or LAZY_MODULES were imported by main.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import __builtin__
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start (all phases) should take less than this
+COLD_START_BUDGET_MS = 1500
+
+# Modules which must not be imported by "import main"
+LAZY_MODULES = [
+  'jinja2',
+  'babel',
+  'webapp2_extras.jinja2',
+  'webapp2_extras.auth',
+  'webapp2_extras.i18n',
+  'handlers.base',
+]
+
+
+class ImportProfiler(object):
+  """Hooks __import__ and records import times of modules"""
+
+  def __init__(self):
+    self.records = []
+    self.phase = None
+    self._stack = []
+    self._orig_import = None
+
+  def start(self):
+    self._orig_import = __builtin__.__import__
+    __builtin__.__import__ = self._import
+
+  def stop(self):
+    __builtin__.__import__ = self._orig_import
+
+  def _import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+    before = len(sys.modules)
+    # [nested imports time, number of modules they loaded]
+    frame = [0.0, 0]
+    self._stack.append(frame)
+    started = time.time()
+    try:
+      return self._orig_import(name, globals, locals, fromlist, level)
+    finally:
+      elapsed = time.time() - started
+      self._stack.pop()
+      loaded = len(sys.modules) - before
+      if self._stack:
+        self._stack[-1][0] += elapsed
+        self._stack[-1][1] += loaded
+      if loaded > frame[1]:
+        self.records.append({
+          'phase': self.phase,
+          'module': _resolve(name, globals, level),
+          'self_ms': (elapsed - frame[0]) * 1000,
+          'cumulative_ms': elapsed * 1000,
+        })
+
+
+def _resolve(name, globals, level):
+  """Absolute name of an imported module, as far as it can be told"""
+  if level == 0 or not globals or not globals.get('__name__'):
+    return name
+  package = globals.get('__package__')
+  if not package:
+    package = globals['__name__']
+    if '__path__' not in globals:
+      package = package.rpartition('.')[0]
+  if level > 1:
+    package = package.rsplit('.', level - 1)[0]
+  candidate = '%s.%s' % (package, name) if name else package
+  if level > 0 or sys.modules.get(candidate):
+    return candidate
+  return name
+
+
+def _setup_testbed():
+  from google.appengine.ext import testbed
+  tb = testbed.Testbed()
+  tb.setup_env(app_id='_')
+  tb.activate()
+  tb.init_datastore_v3_stub()
+  tb.init_memcache_stub()
+  tb.init_taskqueue_stub()
+  os.environ['HTTP_HOST'] = 'localhost'
+  return tb
+
+
+def profile(path='/'):
+  """Profiles a cold start, returns a dict of results"""
+  if APP_ROOT not in sys.path:
+    sys.path.insert(0, APP_ROOT)
+  os.chdir(APP_ROOT)
+  tb = _setup_testbed()
+
+  profiler = ImportProfiler()
+  phases = []
+  results = {'phases': phases, 'path': path}
+  profiler.start()
+  try:
+    def timed(phase, fn):
+      profiler.phase = phase
+      started = time.time()
+      value = fn()
+      phases.append((phase, (time.time() - started) * 1000))
+      return value
+
+    timed('appengine_config', lambda: __import__('appengine_config'))
+    main = timed('main', lambda: __import__('main'))
+    results['loaded_by_main'] = [m for m in LAZY_MODULES if sys.modules.get(m)]
+
+    import webapp2
+    response = timed('first_request',
+                     lambda: webapp2.Request.blank(path).get_response(main.app))
+    results['status'] = response.status_int
+  finally:
+    profiler.stop()
+    tb.deactivate()
+
+  results['total_ms'] = sum(ms for _, ms in phases)
+  results['budget_ms'] = COLD_START_BUDGET_MS
+  results['modules'] = sorted(profiler.records,
+                              key=lambda r: r['self_ms'], reverse=True)
+  return results
+
+
+def report(results, top=20):
+  print 'Cold start of %s: %.1fms (budget %dms)' % (
+    results['path'], results['total_ms'], results['budget_ms'])
+  for phase, ms in results['phases']:
+    print '  %-18s %8.1fms' % (phase, ms)
+  if results['loaded_by_main']:
+    print 'Imported by main but should be lazy: %s' % \
+      ', '.join(results['loaded_by_main'])
+  print
+  print '%-50s %-18s %10s %10s' % ('module', 'phase', 'self ms', 'cum. ms')
+  for r in results['modules'][:top]:
+    print '%-50s %-18s %10.1f %10.1f' % (
+      r['module'][:50], r['phase'], r['self_ms'], r['cumulative_ms'])
+
+
+#
+# Main entry point for command line
+#
+
+def main():
+  """Main entry point for command-line usage"""
+  parser = argparse.ArgumentParser(description='Cold start import profiler')
+  parser.add_argument('--path', default='/', help='URL of the first request')
+  parser.add_argument('--top', type=int, default=20)
+  parser.add_argument('--json', action='store_true')
+  parser.add_argument('--check', action='store_true',
+                      help='fail if over budget or lazy modules were loaded')
+  args = parser.parse_args()
+
+  results = profile(args.path)
+  if args.json:
+    print json.dumps(results, indent=2)
+  else:
+    report(results, args.top)
+  if args.check and (results['total_ms'] >= results['budget_ms'] or
+                     results['loaded_by_main']):
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()